@@ -0,0 +1,118 @@
+"""代币账户余额表内存基准测试
+
+比较原来的 dict[str, float]（base58 地址 -> 余额）与 AccountStore（32 字节公钥 -> 最小单位余额）
+在不同账户数量下的内存占用，以及写入和查询的耗时。
+内存用 tracemalloc 统计结构本身和它持有的对象（包括 dict 的地址字符串和 float）。
+
+用法（在 Backend 目录下运行）:
+    python -m benchmarks.account_store_benchmark
+    python -m benchmarks.account_store_benchmark --sizes 10000 100000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from solders.pubkey import Pubkey
+
+from utils.accounts import AccountStore, pubkey_bytes
+
+DECIMALS = 6
+
+
+def accounts(count: int, seed: int = 0) -> Iterator[Tuple[str, int]]:
+    """确定性的 (base58 地址, 最小单位余额)，每次调用生成新的字符串对象"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield str(Pubkey(rng.randbytes(32))), rng.randrange(10 ** 12)
+
+
+def build_dict(items: Iterator[Tuple[str, int]]) -> Dict[str, float]:
+    states = {}
+    for pubkey, amount in items:
+        states[pubkey] = amount / 10 ** DECIMALS
+    return states
+
+
+def build_store(items: Iterator[Tuple[str, int]]) -> AccountStore:
+    store = AccountStore()
+    for pubkey, amount in items:
+        store.set(pubkey, amount, DECIMALS)
+    return store
+
+
+def measure_memory(build: Callable, count: int) -> float:
+    """构建后仍然存活的内存（MB）"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    structure = build(accounts(count))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del structure
+    return (after - before) / 1024 / 1024
+
+
+def measure_time(count: int, lookups: int) -> Dict[str, float]:
+    """每次写入和查询的平均耗时（微秒）；查询使用消息中的 base58 地址，包括 AccountStore 的解码开销"""
+    items = list(accounts(count))
+    sample = [pubkey for pubkey, _ in random.Random(1).choices(items, k=lookups)]
+    result = {}
+    for name, build, get in (
+        ("dict", build_dict, lambda states, pubkey: states.get(pubkey)),
+        ("store", build_store, lambda store, pubkey: store.get(pubkey)),
+    ):
+        started = time.perf_counter()
+        structure = build(iter(items))
+        result[f"{name}_set_us"] = (time.perf_counter() - started) / count * 1e6
+        started = time.perf_counter()
+        for pubkey in sample:
+            get(structure, pubkey)
+        result[f"{name}_get_us"] = (time.perf_counter() - started) / lookups * 1e6
+        del structure
+    # 已经解码成字节的公钥，只统计索引查找
+    store = build_store(iter(items))
+    keys = [pubkey_bytes(pubkey) for pubkey in sample]
+    started = time.perf_counter()
+    for key in keys:
+        store.get(key)
+    result["store_get_bytes_us"] = (time.perf_counter() - started) / lookups * 1e6
+    return result
+
+
+def run(sizes: List[int], lookups: int) -> List[Dict]:
+    results = []
+    for count in sizes:
+        dict_mb = measure_memory(build_dict, count)
+        store_mb = measure_memory(build_store, count)
+        results.append({
+            "accounts": count,
+            "dict_mb": dict_mb,
+            "store_mb": store_mb,
+            **measure_time(count, min(lookups, count)),
+        })
+    return results
+
+
+def print_report(results: List[Dict]):
+    print(f"{'账户数':>10} {'dict MB':>9} {'store MB':>9} {'节省':>6} "
+          f"{'dict 写入':>9} {'store 写入':>10} {'dict 查询':>9} {'store 查询':>10} {'字节查询':>8} (µs)")
+    for r in results:
+        saved = 1 - r["store_mb"] / r["dict_mb"] if r["dict_mb"] else 0
+        print(f"{r['accounts']:>10} {r['dict_mb']:>9.1f} {r['store_mb']:>9.1f} {saved:>6.0%} "
+              f"{r['dict_set_us']:>9.2f} {r['store_set_us']:>10.2f} "
+              f"{r['dict_get_us']:>9.2f} {r['store_get_us']:>10.2f} {r['store_get_bytes_us']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代币账户余额表内存基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="账户数量")
+    parser.add_argument("--lookups", type=int, default=100000, help="每种结构的查询次数")
+    args = parser.parse_args()
+    print_report(run(args.sizes, args.lookups))
+
+
+if __name__ == "__main__":
+    main()
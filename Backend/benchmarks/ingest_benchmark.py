@@ -0,0 +1,303 @@
+"""监控器端到端写入基准测试
+
+用本地 WebSocket 服务回放语料，驱动 SolanaMonitor 写入一个临时 SQLite 数据库，
+统计每秒处理的消息数、接收到提交的延迟分位数和峰值内存。
+
+用法（在 Backend 目录下运行）:
+    # 回放录制的语料（设置 RECORD_FRAMES_PATH 运行监控器即可录制）
+    python -m benchmarks.ingest_benchmark --corpus frames.jsonl
+    # 生成合成语料
+    python -m benchmarks.ingest_benchmark --synthetic 20000 --wallets 50 --rate 0
+    # 模拟 5 个新代币各需要 0.5 秒获取元数据，比较处理通道数量的影响
+    python -m benchmarks.ingest_benchmark --slow-mints 5 --slow-delay 0.5 --lanes 1
+    python -m benchmarks.ingest_benchmark --slow-mints 5 --slow-delay 0.5 --lanes 8
+"""
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Set
+
+import base58
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from utils import config, models
+from utils.database import create_async_db_engine, create_db_engine
+from utils.monitor import SolanaMonitor
+from utils.registry import WalletRegistry
+from utils.replay import ReplayServer, read_corpus
+
+
+def random_address() -> str:
+    return base58.b58encode(os.urandom(32)).decode()
+
+
+def synthetic_frames(count: int, wallets: int, mints: int, accounts_per_wallet: int = 4) -> List[dict]:
+    """生成模拟的代币账户变化通知，余额随机游走"""
+    owners = [random_address() for _ in range(wallets)]
+    mint_addresses = [random_address() for _ in range(mints)]
+    accounts = []
+    for owner in owners:
+        for _ in range(accounts_per_wallet):
+            accounts.append([random_address(), owner, random.choice(mint_addresses), 0.0])
+
+    frames = []
+    for slot in range(count):
+        account = random.choice(accounts)
+        account[3] = max(0.0, round(account[3] + random.uniform(-50, 100), 6))
+        pubkey, owner, mint, balance = account
+        frames.append({
+            "jsonrpc": "2.0",
+            "method": "programNotification",
+            "params": {
+                "result": {
+                    "context": {"slot": 300000000 + slot},
+                    "value": {
+                        "pubkey": pubkey,
+                        "account": {
+                            "data": {
+                                "parsed": {
+                                    "info": {
+                                        "isNative": False,
+                                        "mint": mint,
+                                        "owner": owner,
+                                        "state": "initialized",
+                                        "tokenAmount": {
+                                            "amount": str(int(balance * 10 ** 6)),
+                                            "decimals": 6,
+                                            "uiAmount": balance,
+                                            "uiAmountString": str(balance)
+                                        }
+                                    },
+                                    "type": "account"
+                                },
+                                "program": "spl-token",
+                                "space": 165
+                            },
+                            "executable": False,
+                            "lamports": 2039280,
+                            "owner": "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA",
+                            "rentEpoch": 18446744073709551615,
+                            "space": 165
+                        }
+                    }
+                },
+                "subscription": 1
+            }
+        })
+    return frames
+
+
+def _token_infos(frames: List[dict]):
+    for frame in frames:
+        info = (frame.get("params", {}).get("result", {}).get("value", {})
+                .get("account", {}).get("data", {}).get("parsed", {}).get("info", {}))
+        if info.get("owner") and info.get("mint"):
+            yield info
+
+
+def mint_addresses(frames: List[dict]) -> set:
+    return {info["mint"] for info in _token_infos(frames)}
+
+
+def seed_database(url: str, frames: List[dict], new_mints: Set[str] = frozenset()):
+    """创建表，并写入语料中出现的钱包和代币（避免基准测试访问外部接口），new_mints 除外"""
+    engine = create_db_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+
+    owners, mints = set(), set()
+    for info in _token_infos(frames):
+        owners.add(info["owner"])
+        if info["mint"] not in new_mints:
+            mints.add(info["mint"])
+
+    with engine.begin() as conn:
+        if owners:
+            conn.execute(models.Wallet.__table__.insert(), [
+                {"name": f"bench-{i}", "address": owner} for i, owner in enumerate(owners)
+            ])
+        if mints:
+            conn.execute(models.Token.__table__.insert(), [
+                {"symbol": f"BENCH-{i}", "name": f"Bench Token {i}", "contract_address": mint,
+                 "decimals": 6, "current_price": 1.0} for i, mint in enumerate(mints)
+            ])
+    engine.dispose()
+    return len(owners), len(mints)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def run_benchmark(frames: List[dict], rate: float, timeout: float, quiet: bool,
+                        lanes: int = config.PROCESS_LANES, slow_mints: int = 0,
+                        slow_delay: float = 0.5) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="solmon-bench-")
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    # 前 slow_mints 个代币不写入数据库，第一次解析时模拟耗时 slow_delay 秒的元数据请求
+    new_mints = set(sorted(mint_addresses(frames))[:slow_mints])
+    wallets, mints = seed_database(url, frames, new_mints)
+
+    async_engine = create_async_db_engine(url)
+    session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    server = ReplayServer(frames, rate=rate)
+    await server.start()
+    total = len(server.frames)
+
+    monitor = SolanaMonitor(session_factory, registry=WalletRegistry(), ws_url=server.url)
+    # 不访问外部价格接口，使用种子数据中的价格；回放服务不会断线，不需要补齐
+    monitor.prices.url = ""
+    monitor.backfill_enabled = False
+    monitor.lanes = lanes
+
+
+    async def slow_metadata(mint_address):
+        await asyncio.sleep(slow_delay)
+        return {"contract_address": mint_address, "decimals": 6, "symbol": f"NEW-{mint_address[:4]}",
+                "name": f"New Token {mint_address[:8]}", "current_price": 1.0}
+
+    monitor.tokens._fetch_metadata = slow_metadata
+
+    # 记录每条消息的接收时间和每笔交易的提交时间（消息是不可变的 AccountUpdate，按 id 索引）
+    queued_at: Dict[int, float] = {}
+    received_at: Dict[int, float] = {}
+    latencies: List[float] = []
+    timing = {"first_received": None, "last_done": None, "processed": 0}
+
+    queue_put = monitor.queue.put
+
+    async def timed_put(update):
+        now = time.perf_counter()
+        if timing["first_received"] is None:
+            timing["first_received"] = now
+        queued_at[id(update)] = now
+        await queue_put(update)
+
+    process_transaction = monitor.process_transaction
+
+    async def timed_process(update):
+        transaction = await process_transaction(update)
+        timing["processed"] += 1
+        timing["last_done"] = time.perf_counter()
+        started = queued_at.pop(id(update), None)
+        if transaction and started is not None:
+            received_at[id(transaction)] = started
+        return transaction
+
+    write = monitor.writer.write
+
+    async def timed_write(rows, holdings=None, accounts=None):
+        written = await write(rows, holdings, accounts)
+        committed_at = time.perf_counter()
+        timing["last_done"] = committed_at
+        for row in rows:
+            started = received_at.pop(id(row), None)
+            if started is not None:
+                latencies.append(committed_at - started)
+        return written
+
+    monitor.queue.put = timed_put
+    monitor.process_transaction = timed_process
+    monitor.writer.write = timed_write
+
+    utils_logger = logging.getLogger("utils")
+    log_level = utils_logger.level
+    if quiet:
+        utils_logger.setLevel(logging.WARNING)
+    try:
+        monitor_task = asyncio.create_task(monitor.start_monitoring())
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            skipped = monitor.queue.dropped + monitor.recent_events.duplicates
+            finished = server.done.is_set() and timing["processed"] + skipped >= total
+            if finished and not received_at:
+                break
+            await asyncio.sleep(0.01)
+        monitor_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await monitor_task
+    finally:
+        utils_logger.setLevel(log_level)
+
+    await server.close()
+    await async_engine.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    elapsed = (timing["last_done"] or 0) - (timing["first_received"] or 0)
+    return {
+        "frames": total,
+        "lanes": lanes,
+        "processed": timing["processed"],
+        "dropped": monitor.queue.dropped,
+        "duplicates": monitor.recent_events.duplicates,
+        "transactions": len(latencies),
+        "wallets": wallets,
+        "mints": mints + len(new_mints),
+        "elapsed": elapsed,
+        "events_per_sec": timing["processed"] / elapsed if elapsed > 0 else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p90": percentile(latencies, 90),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies, default=0.0),
+        # Linux 上 ru_maxrss 的单位是 KB
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def print_report(result: Dict):
+    print(f"消息数量: {result['frames']} (已处理 {result['processed']}, 丢弃 {result['dropped']}, "
+          f"重复 {result['duplicates']})")
+    print(f"钱包/代币: {result['wallets']}/{result['mints']}, 写入交易: {result['transactions']}")
+    print(f"处理通道: {result['lanes']}")
+    print(f"耗时: {result['elapsed']:.2f}s, 吞吐: {result['events_per_sec']:.0f} events/s")
+    print("接收到提交延迟: "
+          f"p50={result['latency_p50'] * 1000:.1f}ms "
+          f"p90={result['latency_p90'] * 1000:.1f}ms "
+          f"p99={result['latency_p99'] * 1000:.1f}ms "
+          f"max={result['latency_max'] * 1000:.1f}ms")
+    print(f"峰值内存 (RSS): {result['peak_rss_mb']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SolanaMonitor 端到端写入基准测试")
+    parser.add_argument("--corpus", help="录制的 JSONL 语料文件")
+    parser.add_argument("--synthetic", type=int, default=10000, help="未指定语料时生成的消息数量")
+    parser.add_argument("--wallets", type=int, default=50, help="合成语料的钱包数量")
+    parser.add_argument("--mints", type=int, default=200, help="合成语料的代币数量")
+    parser.add_argument("--rate", type=float, default=0, help="每秒回放的消息数，0 表示尽可能快")
+    parser.add_argument("--duplicates", type=float, default=0,
+                        help="重复发送的消息比例，模拟重连后节点重发的账户状态")
+    parser.add_argument("--lanes", type=int, default=config.PROCESS_LANES, help="处理通道数量")
+    parser.add_argument("--slow-mints", type=int, default=0, help="第一次解析时模拟慢速获取元数据的代币数量")
+    parser.add_argument("--slow-delay", type=float, default=0.5, help="慢速代币的元数据获取耗时（秒）")
+    parser.add_argument("--timeout", type=float, default=300, help="等待处理完成的最长时间（秒）")
+    parser.add_argument("--verbose", action="store_true", help="显示监控器的输出")
+    args = parser.parse_args()
+
+    if args.corpus:
+        frames = list(read_corpus(args.corpus))
+    else:
+        frames = synthetic_frames(args.synthetic, args.wallets, args.mints)
+    if args.duplicates > 0:
+        frames = [copy for frame in frames
+                  for copy in ((frame, frame) if random.random() < args.duplicates else (frame,))]
+
+    result = asyncio.run(run_benchmark(frames, args.rate, args.timeout, quiet=not args.verbose,
+                                       lanes=args.lanes, slow_mints=args.slow_mints,
+                                       slow_delay=args.slow_delay))
+    print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""持仓估值基准测试
+
+比较价格刷新后重新估值全部钱包的两种方式：
+- 逐个钱包：每个钱包一次持仓查询（/wallets/{id}/holdings/），在 Python 中循环乘以价格并求和
+- PortfolioEngine：钱包 × 代币稀疏矩阵乘价格向量，一次向量运算
+
+内存部分只比较估值本身（不含数据库）；--db-wallets 大于 0 时另外在临时 SQLite 数据库上比较
+逐个钱包查询持仓与 PortfolioLoader 一次读取全部持仓的耗时。
+
+用法（在 Backend 目录下运行）:
+    python -m benchmarks.portfolio_benchmark
+    python -m benchmarks.portfolio_benchmark --wallets 1000 10000 100000 --tokens 5000 --holdings 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from utils import async_crud, models
+from utils.database import create_async_db_engine
+from utils.migrations import migrate_async
+from utils.portfolio import PortfolioEngine, PortfolioLoader
+
+TOP_N = 100
+
+
+def generate(wallets: int, tokens: int, holdings: int, seed: int = 0):
+    """每个钱包持有 holdings 种随机代币；约 1/10 的代币没有价格"""
+    rng = random.Random(seed)
+    prices = {t: (None if t % 10 == 0 else rng.uniform(0.0001, 100)) for t in range(1, tokens + 1)}
+    positions = {
+        w: [(t, rng.uniform(1, 1e6)) for t in rng.sample(range(1, tokens + 1), min(holdings, tokens))]
+        for w in range(1, wallets + 1)
+    }
+    return prices, positions
+
+
+def reprice(prices: Dict[int, float], rng: random.Random) -> Dict[int, float]:
+    """一轮价格刷新：全部有价格的代币变动 ±5%"""
+    return {t: (p if p is None else p * rng.uniform(0.95, 1.05)) for t, p in prices.items()}
+
+
+def loop_revalue(positions: Dict[int, List[Tuple[int, float]]], prices: Dict[int, float]) -> List[Tuple[float, int]]:
+    totals = []
+    for wallet_id, holdings in positions.items():
+        total = 0.0
+        for token_id, balance in holdings:
+            price = prices[token_id]
+            if price is not None:
+                total += balance * price
+        totals.append((total, wallet_id))
+    totals.sort(key=lambda item: (-item[0], item[1]))
+    return totals[:TOP_N]
+
+
+def build_engine(positions, prices) -> PortfolioEngine:
+    engine = PortfolioEngine()
+    for token_id in prices:
+        engine.add_token(token_id, f"mint{token_id}")
+    for wallet_id, holdings in positions.items():
+        engine.add_wallet(wallet_id, f"wallet{wallet_id}")
+        for token_id, balance in holdings:
+            engine.set_holding(wallet_id, token_id, balance)
+    for token_id, price in prices.items():
+        engine.set_price(token_id, price)
+    engine.revalue()
+    return engine
+
+
+def engine_revalue(engine: PortfolioEngine, prices: Dict[int, float]) -> List[dict]:
+    for token_id, price in prices.items():
+        engine.set_price(token_id, price)
+    engine.revalue()
+    return engine.top("value", "desc", TOP_N, positions=0)
+
+
+def run_memory(wallets: int, tokens: int, holdings: int, rounds: int) -> Dict:
+    prices, positions = generate(wallets, tokens, holdings)
+    started = time.perf_counter()
+    engine = build_engine(positions, prices)
+    build = time.perf_counter() - started
+
+    rng = random.Random(1)
+    loop_times, engine_times = [], []
+    for _ in range(rounds):
+        prices = reprice(prices, rng)
+        started = time.perf_counter()
+        expected = loop_revalue(positions, prices)
+        loop_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        top = engine_revalue(engine, prices)
+        engine_times.append(time.perf_counter() - started)
+        # 两种方式的结果应该一致
+        for (total, wallet_id), item in zip(expected, top):
+            assert wallet_id == item["wallet_id"] and abs(total - item["total_value"]) <= 1e-9 * max(1.0, total)
+    return {
+        "wallets": wallets,
+        "holdings": engine.nnz,
+        "build_ms": build * 1000,
+        "loop_ms": min(loop_times) * 1000,
+        "engine_ms": min(engine_times) * 1000,
+    }
+
+
+async def run_db(wallets: int, tokens: int, holdings: int) -> Dict:
+    """临时 SQLite 数据库：逐个钱包查询持仓 vs 一次读取全部持仓并估值"""
+    workdir = tempfile.mkdtemp(prefix="solmon-portfolio-")
+    engine = create_async_db_engine(f"sqlite:///{os.path.join(workdir, 'portfolio.db')}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        await migrate_async(engine)
+        prices, positions = generate(wallets, tokens, holdings)
+        # 初始数据的更新时间分布在过去一小时内，增量刷新只读到下面修改的持仓和回看时间内的少量行
+        now = datetime.now() - timedelta(minutes=1)
+        spread = lambda i: now - timedelta(seconds=i % 3600)
+        async with session_factory() as db:
+            await db.execute(insert(models.Wallet), [
+                {"id": w, "name": f"wallet{w}", "address": f"wallet{w}"} for w in positions])
+            await db.execute(insert(models.Token), [
+                {"id": t, "symbol": f"T{t}", "name": f"T{t}", "contract_address": f"mint{t}", "decimals": 6,
+                 "current_price": p, "price_updated_at": spread(t)} for t, p in prices.items()])
+            await db.execute(insert(models.TokenHolding), [
+                {"wallet_id": w, "token_id": t, "balance": b, "last_updated": spread(w * holdings + i)}
+                for w, items in positions.items() for i, (t, b) in enumerate(items)])
+            await db.commit()
+
+        started = time.perf_counter()
+        totals = []
+        for wallet_id in positions:
+            async with session_factory() as db:
+                rows = await async_crud.get_wallet_holdings(db, wallet_id)
+            totals.append((sum(h.balance * (h.token.current_price or 0) for h in rows), wallet_id))
+        totals.sort(key=lambda item: (-item[0], item[1]))
+        per_wallet = time.perf_counter() - started
+
+        loader = PortfolioLoader(session_factory, PortfolioEngine())
+        started = time.perf_counter()
+        await loader.load()
+        loader.engine.top("value", "desc", TOP_N, positions=0)
+        full_load = time.perf_counter() - started
+
+        # 1% 的持仓发生变化后增量刷新
+        changed = max(1, wallets * holdings // 100)
+        async with session_factory() as db:
+            await db.execute(update(models.TokenHolding).where(models.TokenHolding.id <= changed)
+                             .values(balance=models.TokenHolding.balance * 2, last_updated=datetime.now()))
+            await db.commit()
+        started = time.perf_counter()
+        rows = await loader.poll_once()
+        poll = time.perf_counter() - started
+        return {"wallets": wallets, "per_wallet_ms": per_wallet * 1000, "load_ms": full_load * 1000,
+                "poll_ms": poll * 1000, "poll_rows": rows}
+    finally:
+        await engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="持仓估值基准测试")
+    parser.add_argument("--wallets", type=int, nargs="+", default=[1000, 10000, 100000], help="钱包数量")
+    parser.add_argument("--tokens", type=int, default=5000, help="代币数量")
+    parser.add_argument("--holdings", type=int, default=20, help="每个钱包持有的代币数")
+    parser.add_argument("--rounds", type=int, default=5, help="价格刷新轮数（取最快一轮）")
+    parser.add_argument("--db-wallets", type=int, default=1000, help="数据库对比的钱包数量，0 表示跳过")
+    args = parser.parse_args()
+
+    print(f"价格刷新后重新估值并取前 {TOP_N} 名（内存，不含数据库）")
+    print(f"{'钱包数':>8} {'持仓数':>9} {'构建 ms':>9} {'逐个钱包 ms':>12} {'矩阵 ms':>9} {'加速':>7}")
+    for wallets in args.wallets:
+        r = run_memory(wallets, args.tokens, args.holdings, args.rounds)
+        print(f"{r['wallets']:>8} {r['holdings']:>9} {r['build_ms']:>9.1f} {r['loop_ms']:>12.1f} "
+              f"{r['engine_ms']:>9.2f} {r['loop_ms'] / r['engine_ms']:>6.0f}x")
+
+    if args.db_wallets:
+        r = asyncio.run(run_db(args.db_wallets, args.tokens, args.holdings))
+        print(f"\nSQLite，{r['wallets']} 个钱包")
+        print(f"逐个钱包查询持仓并估值: {r['per_wallet_ms']:.0f}ms")
+        print(f"PortfolioLoader 全量加载并估值: {r['load_ms']:.0f}ms")
+        print(f"PortfolioLoader 增量刷新（{r['poll_rows']} 行变化）: {r['poll_ms']:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""API 冷启动基准测试
+
+启动 uvicorn 子进程（空的临时 SQLite 数据库，启动时执行迁移），统计从启动进程到第一个请求
+成功返回的时间，以及单独导入 main 的耗时；同时检查 API 进程没有导入监控器使用的链上库。
+超过 --budget 或导入了链上库时以非零状态退出，可以作为启动时间的回归检查。
+
+用法（在 Backend 目录下运行）:
+    python -m benchmarks.startup_benchmark --runs 5 --budget 3
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# API 进程不应该导入的模块（只有监控器需要，见 main.start_monitor）；
+# 后三个在模块顶层导入 solders，只能由监控器导入
+MONITOR_ONLY_MODULES = ("solana", "solders", "spl", "websockets", "base58", "utils.monitor",
+                        "utils.accounts", "utils.backfill", "utils.transactions")
+FIRST_REQUEST_PATH = "/api/tokens/"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def child_env(workdir: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+        "MONITOR_IN_API": "false",
+        "AUTO_MIGRATE": "true",
+    }
+
+
+def time_to_first_request(workdir: str, timeout: float) -> Optional[float]:
+    """启动 uvicorn，返回第一个请求成功的耗时（秒），超时返回 None"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{FIRST_REQUEST_PATH}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=child_env(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn 退出: {process.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.01)
+        return None
+    finally:
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def import_profile(workdir: str) -> Dict:
+    """在新进程中导入 main，返回导入耗时和已导入的链上库"""
+    code = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"modules = [m for m in {MONITOR_ONLY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'seconds': elapsed, 'modules': modules}))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=child_env(workdir),
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs: int, timeout: float) -> Dict:
+    imports: List[float] = []
+    first_requests: List[float] = []
+    modules: List[str] = []
+    for _ in range(runs):
+        # 每次使用新的数据库，包括执行全部迁移的时间
+        workdir = tempfile.mkdtemp(prefix="solmon-startup-")
+        try:
+            profile = import_profile(workdir)
+            imports.append(profile["seconds"])
+            modules = profile["modules"]
+            elapsed = time_to_first_request(workdir, timeout)
+            if elapsed is None:
+                raise RuntimeError(f"{timeout} 秒内没有成功的请求")
+            first_requests.append(elapsed)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "runs": runs,
+        "import_median": statistics.median(imports),
+        "first_request_min": min(first_requests),
+        "first_request_median": statistics.median(first_requests),
+        "first_request_max": max(first_requests),
+        "monitor_modules": modules,
+    }
+
+
+def print_report(result: Dict):
+    print(f"运行次数: {result['runs']}")
+    print(f"导入 main: {result['import_median'] * 1000:.0f}ms (中位数)")
+    print("启动到第一个请求: "
+          f"min={result['first_request_min'] * 1000:.0f}ms "
+          f"median={result['first_request_median'] * 1000:.0f}ms "
+          f"max={result['first_request_max'] * 1000:.0f}ms")
+    print(f"API 进程导入的链上库: {', '.join(result['monitor_modules']) or '无'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 冷启动基准测试")
+    parser.add_argument("--runs", type=int, default=3, help="启动次数")
+    parser.add_argument("--budget", type=float, default=0, help="启动到第一个请求的中位数上限（秒），0 表示不检查")
+    parser.add_argument("--timeout", type=float, default=30, help="每次启动等待第一个请求的最长时间（秒）")
+    args = parser.parse_args()
+
+    result = run(args.runs, args.timeout)
+    print_report(result)
+
+    failed = False
+    if result["monitor_modules"]:
+        print("失败: API 进程导入了监控器使用的链上库")
+        failed = True
+    if args.budget and result["first_request_median"] > args.budget:
+        print(f"失败: 启动时间超出预算 {args.budget:.2f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
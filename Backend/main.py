@@ -1,32 +1,40 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from utils.routes import router
-from utils.database import engine, SessionLocal
-from utils.monitor import run_monitor
-import utils.models
+from utils.database import async_engine, AsyncSessionLocal
+from utils.migrations import migrate_async
+from utils.tailer import TransactionTailer
+from utils.portfolio import PortfolioLoader
+from utils.metrics import REQUEST_SECONDS
+from utils import config
 import asyncio
+import time
 import uvicorn
 from contextlib import asynccontextmanager
 
 async def start_monitor():
     """启动监控任务"""
-    db = SessionLocal()
-    try:
-        await run_monitor(db)
-    finally:
-        db.close()
+    # 监控器依赖的链上库（solana/solders/websockets）只在需要时导入，API 进程启动更快
+    from utils.monitor import run_monitor
+    await run_monitor()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 在后台启动监控任务
-    monitor_task = asyncio.create_task(start_monitor())
+    # 数据库迁移在启动时显式执行，导入模块不访问数据库
+    if config.AUTO_MIGRATE:
+        await migrate_async(async_engine)
+    # 从数据库追踪新交易，供实时动态和排行榜使用（监控器可能在其他进程中）
+    tasks = [asyncio.create_task(TransactionTailer(AsyncSessionLocal).run())]
+    # 定时读取持仓和价格变化，更新 /api/portfolios 使用的估值矩阵
+    tasks.append(asyncio.create_task(PortfolioLoader(AsyncSessionLocal).run()))
+    # 单进程部署时在后台启动监控任务；多个 worker 时单独运行 monitor_worker.py
+    if config.MONITOR_IN_API:
+        tasks.append(asyncio.create_task(start_monitor()))
     yield
-    # 关闭监控任务
-    monitor_task.cancel()
-    try:
-        await monitor_task
-    except asyncio.CancelledError:
-        pass
+    # 关闭后台任务
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 app = FastAPI(lifespan=lifespan)
 
@@ -39,8 +47,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 创建数据库表
-utils.models.Base.metadata.create_all(bind=engine)
+# 记录每个路由的请求耗时，按路由模板（而不是实际路径）分组，避免标签数量无限增长
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(
+            request.method,
+            route.path if route is not None else "unmatched",
+            status
+        ).observe(time.perf_counter() - started)
 
 # 注册路由
 app.include_router(router, prefix="/api")
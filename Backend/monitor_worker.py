@@ -0,0 +1,63 @@
+"""独立运行的监控进程
+
+API 进程（可以是多个 uvicorn worker）只提供接口，不接收链上数据；监控器在本进程中运行。
+可以同时启动多个本进程作为热备，通过数据库租约保证只有一个在接收，主实例退出后备用实例接管。
+
+用法（在 Backend 目录下运行）:
+    python monitor_worker.py
+"""
+import asyncio
+import signal
+from typing import Optional
+from aiohttp import web
+from utils import config
+from utils.database import async_engine
+from utils.log import get_logger
+from utils.metrics import metrics
+from utils.migrations import migrate_async
+from utils.monitor import run_monitor
+
+logger = get_logger("utils.worker")
+
+
+async def start_metrics_server(port: int) -> Optional[web.AppRunner]:
+    """在 /metrics 导出本进程的 Prometheus 指标"""
+    if not port:
+        return None
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(body=metrics.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    logger.info("指标已导出", extra={"port": port})
+    return runner
+
+
+async def main():
+    # 执行数据库迁移（包括租约表）
+    if config.AUTO_MIGRATE:
+        await migrate_async(async_engine)
+
+    runner = await start_metrics_server(config.MONITOR_METRICS_PORT)
+    monitor_task = asyncio.create_task(run_monitor())
+    # 收到 SIGTERM 时释放租约后退出，备用实例可以立即接管
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, monitor_task.cancel)
+    try:
+        await monitor_task
+    except asyncio.CancelledError:
+        logger.info("监控进程退出")
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+"""API 冷启动回归测试（见 benchmarks/startup_benchmark.py）
+
+在子进程中导入 main 并启动 uvicorn（空的临时 SQLite 数据库，启动时执行迁移）：
+API 进程不能导入监控器使用的链上库，导入和启动到第一个请求都要在预算内。
+
+测试依赖见 requirements-dev.txt，在 Backend 目录下运行 python -m pytest。
+"""
+import os
+
+from benchmarks.startup_benchmark import import_profile, time_to_first_request
+
+# 导入 main 和启动到第一个请求的时间上限（秒），较慢的机器上可以用环境变量放宽
+IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "2"))
+FIRST_REQUEST_BUDGET = float(os.getenv("STARTUP_FIRST_REQUEST_BUDGET", "5"))
+
+
+def test_import_main_skips_monitor_modules(tmp_path):
+    profile = import_profile(str(tmp_path))
+    assert profile["modules"] == [], f"API 进程导入了监控器使用的模块: {profile['modules']}"
+    assert profile["seconds"] < IMPORT_BUDGET
+
+
+def test_first_request_within_budget(tmp_path):
+    elapsed = time_to_first_request(str(tmp_path), FIRST_REQUEST_BUDGET)
+    assert elapsed is not None, f"{FIRST_REQUEST_BUDGET} 秒内没有成功的请求"
@@ -0,0 +1,123 @@
+from array import array
+from typing import Iterator, Optional, Tuple, Union
+from solders.pubkey import Pubkey
+
+Key = Union[str, bytes]
+
+_EMPTY = -1
+_KEY_SIZE = 32
+
+
+def pubkey_bytes(pubkey: Key) -> bytes:
+    """base58 地址转换为 32 字节公钥，已经是字节时原样返回"""
+    if isinstance(pubkey, str):
+        return bytes(Pubkey.from_string(pubkey))
+    if type(pubkey) is bytes and len(pubkey) == _KEY_SIZE:
+        return pubkey
+    if len(pubkey) != _KEY_SIZE:
+        raise ValueError(f"公钥长度应为 {_KEY_SIZE} 字节: {len(pubkey)}")
+    return bytes(pubkey)
+
+
+class AccountStore:
+    """代币账户余额表，按 32 字节公钥索引
+
+    公钥、余额（最小单位的整数）、精度和账户通知最后报告的 slot 分别存放在连续的数组中，
+    开放寻址（线性探测）的索引表只保存条目下标，装载率不超过 1/2。
+    每个账户约占 32 + 8 + 1 + 8 字节加上索引的 8~16 字节，没有 base58 字符串、
+    float 对象和字典条目的开销，适合监控几十万以上的代币账户。
+    不支持删除：代币账户关闭后余额为 0，条目保留。
+    """
+
+    def __init__(self, capacity: int = 1024):
+        size = 8
+        while size < capacity * 2:
+            size *= 2
+        self._index = array("i", [_EMPTY]) * size
+        self._keys = bytearray()
+        self._amounts = array("Q")
+        self._decimals = array("B")
+        self._slots = array("Q")
+
+    def __len__(self) -> int:
+        return len(self._amounts)
+
+    def __contains__(self, pubkey: Key) -> bool:
+        return self._find(pubkey_bytes(pubkey))[1] != _EMPTY
+
+    def _find(self, key: bytes) -> Tuple[int, int]:
+        """返回 (索引槽位, 条目下标)，不存在时条目下标为 _EMPTY"""
+        index, keys = self._index, self._keys
+        mask = len(index) - 1
+        slot = hash(key) & mask
+        while True:
+            entry = index[slot]
+            if entry == _EMPTY:
+                return slot, entry
+            # 公钥定长，从条目起点比较前缀即可，不需要切片复制
+            if keys.startswith(key, entry * _KEY_SIZE):
+                return slot, entry
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        size = len(self._index) * 2
+        mask = size - 1
+        index = array("i", [_EMPTY]) * size
+        keys = self._keys
+        for entry in range(len(self._amounts)):
+            start = entry * _KEY_SIZE
+            slot = hash(bytes(keys[start:start + _KEY_SIZE])) & mask
+            while index[slot] != _EMPTY:
+                slot = (slot + 1) & mask
+            index[slot] = entry
+        self._index = index
+
+    def get(self, pubkey: Key) -> Optional[int]:
+        """余额（最小单位），没有记录时返回 None"""
+        entry = self._find(pubkey_bytes(pubkey))[1]
+        return None if entry == _EMPTY else self._amounts[entry]
+
+    def ui_amount(self, pubkey: Key) -> Optional[float]:
+        """按精度换算后的余额，没有记录时返回 None"""
+        entry = self._find(pubkey_bytes(pubkey))[1]
+        if entry == _EMPTY:
+            return None
+        return self._amounts[entry] / 10 ** self._decimals[entry]
+
+    def slot(self, pubkey: Key) -> Optional[int]:
+        """账户通知最后报告的 slot（没有收到过通知时为 0），没有记录时返回 None"""
+        entry = self._find(pubkey_bytes(pubkey))[1]
+        return None if entry == _EMPTY else self._slots[entry]
+
+    def set(self, pubkey: Key, amount: int, decimals: int, slot: Optional[int] = None):
+        """更新余额；slot 为 None 时保留原来的 slot"""
+        key = pubkey_bytes(pubkey)
+        index_slot, entry = self._find(key)
+        if entry != _EMPTY:
+            self._amounts[entry] = amount
+            self._decimals[entry] = decimals
+            if slot is not None:
+                self._slots[entry] = slot
+            return
+        entry = len(self._amounts)
+        self._keys += key
+        self._amounts.append(amount)
+        self._decimals.append(decimals)
+        self._slots.append(slot or 0)
+        self._index[index_slot] = entry
+        if (entry + 1) * 2 > len(self._index):
+            self._grow()
+
+    def items(self) -> Iterator[Tuple[bytes, int, int]]:
+        """(公钥, 余额, 精度)"""
+        keys = self._keys
+        for entry in range(len(self._amounts)):
+            start = entry * _KEY_SIZE
+            yield bytes(keys[start:start + _KEY_SIZE]), self._amounts[entry], self._decimals[entry]
+
+    @property
+    def nbytes(self) -> int:
+        """各数组占用的字节数"""
+        return (len(self._keys) + self._amounts.itemsize * len(self._amounts)
+                + len(self._decimals) + self._slots.itemsize * len(self._slots)
+                + self._index.itemsize * len(self._index))
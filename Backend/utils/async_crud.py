@@ -0,0 +1,464 @@
+import base64
+from sqlalchemy import bindparam, insert, or_, select, update, func, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager, joinedload, raiseload
+from utils import models, schemas
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+# 数据访问层（异步会话），供 API 路由和监控器使用
+
+def _insert(db: AsyncSession, model):
+    """返回当前数据库方言的 INSERT 语句（支持 ON CONFLICT）"""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+async def get_wallet(db: AsyncSession, wallet_id: int):
+    return await db.get(models.Wallet, wallet_id)
+
+async def get_wallet_by_address(db: AsyncSession, address: str):
+    result = await db.execute(select(models.Wallet).where(models.Wallet.address == address))
+    return result.scalars().first()
+
+async def get_wallets(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(select(models.Wallet).offset(skip).limit(limit))
+    return result.scalars().all()
+
+async def get_all_wallets(db: AsyncSession):
+    """获取全部钱包（监控器使用，不分页）"""
+    result = await db.execute(select(models.Wallet))
+    return result.scalars().all()
+
+async def create_wallet(db: AsyncSession, wallet: schemas.WalletCreate):
+    db_wallet = models.Wallet(**wallet.model_dump())
+    db.add(db_wallet)
+    await db.commit()
+    await db.refresh(db_wallet)
+    return db_wallet
+
+async def bulk_create_wallets(db: AsyncSession, wallets: List[dict]):
+    """批量创建钱包并提交，返回 (新建的钱包, 已存在的地址)
+
+    先用一次 IN 查询排除已存在的地址，再用一条 INSERT ... ON CONFLICT DO NOTHING
+    写入其余钱包；并发导入时冲突的行不会返回，同样视为已存在。
+    """
+    addresses = [w["address"] for w in wallets]
+    result = await db.execute(select(models.Wallet.address).where(models.Wallet.address.in_(addresses)))
+    existing = set(result.scalars().all())
+
+    new_wallets = [w for w in wallets if w["address"] not in existing]
+    created = []
+    if new_wallets:
+        stmt = (
+            _insert(db, models.Wallet)
+            .on_conflict_do_nothing(index_elements=["address"])
+            .returning(models.Wallet)
+        )
+        result = await db.execute(stmt, new_wallets)
+        created = list(result.scalars().all())
+        await db.commit()
+
+    created_addresses = {w.address for w in created}
+    return created, [address for address in addresses if address not in created_addresses]
+
+async def delete_wallet(db: AsyncSession, wallet_id: int):
+    wallet = await db.get(models.Wallet, wallet_id)
+    if wallet:
+        await db.delete(wallet)
+        await db.commit()
+        return True
+    return False
+
+async def update_wallet(db: AsyncSession, wallet_id: int, wallet: schemas.WalletUpdate):
+    db_wallet = await db.get(models.Wallet, wallet_id)
+    for key, value in wallet.model_dump(exclude_unset=True).items():
+        setattr(db_wallet, key, value)
+    await db.commit()
+    await db.refresh(db_wallet)
+    return db_wallet
+
+async def create_transaction(db: AsyncSession, transaction_data: dict):
+    db_transaction = models.Transaction(**transaction_data)
+    db.add(db_transaction)
+    await db.commit()
+    await db.refresh(db_transaction, ["wallet", "token"])
+    return db_transaction
+
+# 交易记录中对应数据库列的字段，其余字段（如推送用的钱包地址）写入时忽略
+TRANSACTION_COLUMNS = frozenset(c.name for c in models.Transaction.__table__.columns)
+
+async def _add_transactions(db: AsyncSession, transactions: List[dict]):
+    """写入交易记录（不提交），跳过已存在的交易哈希，返回新增的交易记录
+
+    使用 INSERT ... ON CONFLICT (tx_hash) DO NOTHING RETURNING：重复的交易不报错、
+    不回滚同一批的其他交易，也不需要先查询已存在的哈希。
+    """
+    unique = {}
+    for transaction_data in transactions:
+        unique.setdefault(transaction_data["tx_hash"], transaction_data)
+    if not unique:
+        return []
+
+    # 一条 executemany，不为每行构造 ORM 对象
+    result = await db.execute(
+        _insert(db, models.Transaction)
+        .on_conflict_do_nothing(index_elements=["tx_hash"])
+        .returning(models.Transaction.tx_hash),
+        [{k: v for k, v in t.items() if k in TRANSACTION_COLUMNS} for t in unique.values()]
+    )
+    inserted = set(result.scalars().all())
+    return [t for tx_hash, t in unique.items() if tx_hash in inserted]
+
+async def _upsert_holdings(db: AsyncSession, holdings: Dict[Tuple[int, int], float]):
+    """更新或新增持仓记录（不提交）"""
+    if not holdings:
+        return
+    result = await db.execute(
+        select(models.TokenHolding.id, models.TokenHolding.wallet_id, models.TokenHolding.token_id)
+        .where(tuple_(models.TokenHolding.wallet_id, models.TokenHolding.token_id).in_(list(holdings)))
+    )
+    existing = {(wallet_id, token_id): holding_id for holding_id, wallet_id, token_id in result.all()}
+
+    now = datetime.now()
+    updates, inserts = [], []
+    for (wallet_id, token_id), balance in holdings.items():
+        holding_id = existing.get((wallet_id, token_id))
+        if holding_id is None:
+            inserts.append({"wallet_id": wallet_id, "token_id": token_id, "balance": balance, "last_updated": now})
+        else:
+            updates.append({"id": holding_id, "balance": balance, "last_updated": now})
+    # 按主键批量更新、批量插入
+    if updates:
+        await db.execute(update(models.TokenHolding), updates)
+    if inserts:
+        await db.execute(insert(models.TokenHolding), inserts)
+
+async def _upsert_token_accounts(db: AsyncSession, accounts: Optional[Dict[str, Tuple[int, int, int, int]]]):
+    """更新或新增代币账户余额（不提交），accounts 为 代币账户地址 -> (wallet_id, token_id, 余额, 精度)"""
+    if not accounts:
+        return
+    now = datetime.now()
+    stmt = _insert(db, models.TokenAccount)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["pubkey"],
+        set_={column: stmt.excluded[column]
+              for column in ("wallet_id", "token_id", "amount", "decimals", "last_updated")}
+    )
+    await db.execute(stmt, [
+        {"pubkey": pubkey, "wallet_id": wallet_id, "token_id": token_id, "amount": str(amount),
+         "decimals": decimals, "last_updated": now}
+        for pubkey, (wallet_id, token_id, amount, decimals) in accounts.items()
+    ])
+
+async def save_transaction_batch(db: AsyncSession, transactions: List[dict],
+                                 holdings: Dict[Tuple[int, int], float],
+                                 accounts: Optional[Dict[str, Tuple[int, int, int, int]]] = None):
+    """在同一个事务中写入一批交易及其产生的持仓和代币账户余额变化，返回实际新增的交易记录"""
+    new_transactions = await _add_transactions(db, transactions)
+    await _upsert_holdings(db, holdings)
+    await _upsert_token_accounts(db, accounts)
+    await db.commit()
+    return new_transactions
+
+def encode_cursor(transaction: models.Transaction) -> str:
+    """把 (timestamp, id) 编码为不透明的游标"""
+    raw = f"{transaction.timestamp.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    timestamp, transaction_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(timestamp), int(transaction_id)
+
+async def count_transactions(db: AsyncSession, mode: str = "exact"):
+    """统计交易总数: exact 精确计数, approx 使用表统计信息近似, none 不统计"""
+    if mode == "none":
+        return None
+    if mode == "approx":
+        if db.bind.dialect.name == "postgresql":
+            return await db.scalar(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = 'transactions'"
+            ))
+        # SQLite: 自增主键的最大值近似行数，只读主键索引的末尾
+        return await db.scalar(select(func.max(models.Transaction.id))) or 0
+    return await db.scalar(select(func.count()).select_from(models.Transaction))
+
+async def get_monitoring_transactions(db: AsyncSession, skip: int = 0, limit: int = 20,
+                                      cursor: Optional[str] = None, total_mode: str = "exact",
+                                      compact: bool = False):
+    """获取所有钱包的最新交易记录，按时间倒序排序
+
+    cursor 为 None 时使用 OFFSET 分页；否则使用 (timestamp, id) 游标分页，
+    空字符串表示第一页。游标分页走复合索引，耗时与页码无关。
+    compact 为 True 时不加载交易上的关联对象，另外返回本页去重后的 wallets/tokens。
+    """
+    total = await count_transactions(db, total_mode)
+
+    query = (
+        select(models.Transaction)
+        .join(models.Transaction.wallet)  # 关联钱包表
+        .order_by(models.Transaction.timestamp.desc(), models.Transaction.id.desc())  # 按时间倒序
+    )
+    if compact:
+        query = query.options(raiseload("*"))
+    else:
+        # 异步会话不能延迟加载：钱包复用已有的 JOIN，代币在同一条查询中 JOIN 加载
+        query = query.options(contains_eager(models.Transaction.wallet), joinedload(models.Transaction.token))
+
+    next_cursor = None
+    if cursor is None:
+        result = await db.execute(query.offset(skip).limit(limit))
+        transactions = result.scalars().all()
+    else:
+        if cursor:
+            query = query.where(
+                tuple_(models.Transaction.timestamp, models.Transaction.id) < decode_cursor(cursor)
+            )
+        # 多取一条判断是否还有下一页
+        result = await db.execute(query.limit(limit + 1))
+        transactions = result.scalars().all()
+        if len(transactions) > limit:
+            transactions = transactions[:limit]
+            next_cursor = encode_cursor(transactions[-1])
+
+    page = {
+        "items": transactions,
+        "total": total,
+        "total_pages": (total + limit - 1) // limit if total is not None else None,  # 向上取整
+        "next_cursor": next_cursor
+    }
+    if compact:
+        page["wallets"] = await get_wallets_by_ids(db, {t.wallet_id for t in transactions})
+        page["tokens"] = await get_tokens_by_ids(db, {t.token_id for t in transactions})
+    return page
+
+def _transaction_feed_query():
+    """交易及其钱包、代币信息的扁平查询，字段与监控器推送的交易字典一致"""
+    return (
+        select(
+            models.Transaction.id,
+            models.Transaction.tx_hash,
+            models.Transaction.amount,
+            models.Transaction.tx_type,
+            models.Transaction.quantity,
+            models.Transaction.timestamp,
+            models.Transaction.wallet_id,
+            models.Transaction.token_id,
+            models.Wallet.address.label("wallet_address"),
+            models.Wallet.name.label("wallet_name"),
+            models.Token.contract_address.label("token_address"),
+            models.Token.symbol.label("token_symbol"),
+        )
+        .join(models.Wallet, models.Transaction.wallet_id == models.Wallet.id)
+        .join(models.Token, models.Transaction.token_id == models.Token.id)
+    )
+
+async def get_transactions_since(db: AsyncSession, since: datetime):
+    """获取某个时间之后的交易（带钱包和代币信息），按时间正序，用于重建滑动窗口汇总"""
+    result = await db.execute(
+        _transaction_feed_query()
+        .where(models.Transaction.timestamp >= since)
+        .order_by(models.Transaction.timestamp)
+    )
+    return [dict(row) for row in result.mappings().all()]
+
+async def get_transactions_after(db: AsyncSession, after_id: int, limit: int = 1000):
+    """获取 id 大于 after_id 的交易（带钱包和代币信息），按 id 正序，用于追踪新交易"""
+    result = await db.execute(
+        _transaction_feed_query()
+        .where(models.Transaction.id > after_id)
+        .order_by(models.Transaction.id)
+        .limit(limit)
+    )
+    return [dict(row) for row in result.mappings().all()]
+
+async def get_max_transaction_id(db: AsyncSession) -> int:
+    return await db.scalar(select(func.max(models.Transaction.id))) or 0
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+async def acquire_lease(db: AsyncSession, name: str, holder: str, ttl: float) -> bool:
+    """获取或续约租约：租约不存在、已过期或本来就由 holder 持有时成功
+
+    条件 UPDATE 在两种数据库上都是原子的（SQLite 串行化写入，PostgreSQL 行锁后重新检查条件），
+    两个实例同时抢一个过期租约时只有一个更新成功。
+    """
+    now = _utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    result = await db.execute(
+        update(models.Lease)
+        .where(models.Lease.name == name,
+               or_(models.Lease.holder == holder, models.Lease.expires_at < now))
+        .values(holder=holder, expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    acquired = result.rowcount > 0
+    if not acquired:
+        # 租约行还不存在时插入；已存在（由其他实例持有）时不插入
+        result = await db.execute(
+            _insert(db, models.Lease)
+            .values(name=name, holder=holder, expires_at=expires_at)
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        acquired = result.rowcount > 0
+    await db.commit()
+    return acquired
+
+async def release_lease(db: AsyncSession, name: str, holder: str):
+    """释放租约（立即过期），备用实例下一次尝试即可接管"""
+    await db.execute(
+        update(models.Lease)
+        .where(models.Lease.name == name, models.Lease.holder == holder)
+        .values(expires_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+async def get_wallet_transactions(db: AsyncSession, wallet_id: int):
+    result = await db.execute(
+        select(models.Transaction)
+        .where(models.Transaction.wallet_id == wallet_id)
+        .options(joinedload(models.Transaction.wallet), joinedload(models.Transaction.token))
+        .order_by(models.Transaction.timestamp.desc())
+    )
+    return result.scalars().all()
+
+async def get_transaction_by_hash(db: AsyncSession, tx_hash: str):
+    """根据交易哈希获取交易记录"""
+    result = await db.execute(select(models.Transaction).where(models.Transaction.tx_hash == tx_hash))
+    return result.scalars().first()
+
+async def get_token(db: AsyncSession, token_id: int):
+    return await db.get(models.Token, token_id)
+
+async def get_tokens(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(select(models.Token).offset(skip).limit(limit))
+    return result.scalars().all()
+
+async def get_token_by_symbol(db: AsyncSession, symbol: str):
+    result = await db.execute(select(models.Token).where(models.Token.symbol == symbol))
+    return result.scalars().first()
+
+async def get_token_by_address(db: AsyncSession, contract_address: str):
+    result = await db.execute(select(models.Token).where(models.Token.contract_address == contract_address))
+    return result.scalars().first()
+
+async def create_token(db: AsyncSession, token_data: dict):
+    db_token = models.Token(**token_data)
+    db.add(db_token)
+    await db.commit()
+    await db.refresh(db_token)
+    return db_token
+
+async def get_wallets_by_ids(db: AsyncSession, wallet_ids) -> Dict[int, models.Wallet]:
+    """用一次查询获取多个钱包，返回 id -> 钱包"""
+    if not wallet_ids:
+        return {}
+    result = await db.execute(select(models.Wallet).where(models.Wallet.id.in_(wallet_ids)))
+    return {wallet.id: wallet for wallet in result.scalars().all()}
+
+async def get_tokens_by_ids(db: AsyncSession, token_ids) -> Dict[int, models.Token]:
+    """用一次查询获取多个代币，返回 id -> 代币"""
+    if not token_ids:
+        return {}
+    result = await db.execute(select(models.Token).where(models.Token.id.in_(token_ids)))
+    return {token.id: token for token in result.scalars().all()}
+
+async def get_tokens_by_addresses(db: AsyncSession, contract_addresses: List[str]):
+    """用一次查询获取多个合约地址对应的代币"""
+    result = await db.execute(select(models.Token).where(models.Token.contract_address.in_(contract_addresses)))
+    return result.scalars().all()
+
+async def get_or_create_token(db: AsyncSession, token_data: dict):
+    """插入代币（已存在时忽略），返回数据库中的记录
+
+    符号也有唯一约束，不同代币的符号冲突时在符号后附加地址前缀。
+    """
+    contract_address = token_data["contract_address"]
+    for symbol in (token_data["symbol"], f"{token_data['symbol']}-{contract_address[:4]}"):
+        stmt = _insert(db, models.Token).values(**{**token_data, "symbol": symbol}).on_conflict_do_nothing()
+        await db.execute(stmt)
+        await db.commit()
+        token = await get_token_by_address(db, contract_address)
+        if token:
+            return token
+    raise ValueError(f"无法创建代币: {contract_address}")
+
+async def update_token_metadata(db: AsyncSession, token: models.Token, token_data: dict):
+    """更新代币的名称、符号和精度，符号冲突时保留原符号"""
+    token.name = token_data["name"]
+    token.decimals = token_data["decimals"]
+    if not await get_token_by_symbol(db, token_data["symbol"]):
+        token.symbol = token_data["symbol"]
+    await db.commit()
+    await db.refresh(token)
+    return token
+
+async def get_token_prices(db: AsyncSession):
+    """获取全部代币的 (合约地址, 当前价格, 价格更新时间)，价格引擎启动时预热"""
+    result = await db.execute(
+        select(models.Token.contract_address, models.Token.current_price, models.Token.price_updated_at)
+    )
+    return result.all()
+
+async def update_token_prices(db: AsyncSession, prices: Dict[str, Tuple[float, datetime]]):
+    """按合约地址批量写回价格（一条 executemany）并提交"""
+    if not prices:
+        return
+    token_table = models.Token.__table__
+    stmt = (
+        token_table.update()
+        .where(token_table.c.contract_address == bindparam("b_address"))
+        .values(current_price=bindparam("b_price"), price_updated_at=bindparam("b_updated_at"))
+    )
+    await db.execute(stmt, [
+        {"b_address": address, "b_price": price, "b_updated_at": updated_at}
+        for address, (price, updated_at) in prices.items()
+    ])
+    await db.commit()
+
+async def get_all_holdings(db: AsyncSession):
+    """获取全部持仓记录（监控器启动时预热账户状态）"""
+    result = await db.execute(select(models.TokenHolding))
+    return result.scalars().all()
+
+async def get_all_token_accounts(db: AsyncSession):
+    """获取全部代币账户余额（监控器启动时按代币账户预热）"""
+    result = await db.execute(select(models.TokenAccount))
+    return result.scalars().all()
+
+async def get_portfolio_holdings(db: AsyncSession, since: Optional[datetime] = None):
+    """持仓及其钱包和代币信息（持仓估值矩阵），since 不为空时只返回此后更新的持仓
+
+    返回 (wallet_id, token_id, balance, last_updated, 钱包地址, 钱包名称, 代币地址, 代币符号, 当前价格)，
+    已删除钱包的持仓不返回。
+    """
+    holding, wallet, token = models.TokenHolding, models.Wallet, models.Token
+    stmt = (
+        select(holding.wallet_id, holding.token_id, holding.balance, holding.last_updated,
+               wallet.address, wallet.name, token.contract_address, token.symbol, token.current_price)
+        .join(wallet, wallet.id == holding.wallet_id)
+        .join(token, token.id == holding.token_id)
+    )
+    if since is not None:
+        stmt = stmt.where(holding.last_updated >= since)
+    result = await db.execute(stmt)
+    return result.all()
+
+async def get_token_prices_since(db: AsyncSession, since: Optional[datetime] = None):
+    """代币的 (id, 当前价格, 价格更新时间)，since 不为空时只返回此后更新过价格的代币"""
+    stmt = select(models.Token.id, models.Token.current_price, models.Token.price_updated_at)
+    if since is not None:
+        stmt = stmt.where(models.Token.price_updated_at >= since)
+    result = await db.execute(stmt)
+    return result.all()
+
+async def get_wallet_holdings(db: AsyncSession, wallet_id: int):
+    result = await db.execute(
+        select(models.TokenHolding)
+        .where(models.TokenHolding.wallet_id == wallet_id)
+        .options(joinedload(models.TokenHolding.token))
+    )
+    return result.scalars().all()
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from . import config
+from .decoder import SignatureNotice
+from .endpoints import RpcPool
+from .log import get_logger
+from .metrics import BACKFILL_SIGNATURES, ERRORS
+
+logger = get_logger(__name__)
+
+
+class RateLimiter:
+    """令牌桶限速：平均每秒 rate 次，最多 burst 次突发"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Backfiller:
+    """断线后补齐遗漏的交易
+
+    对每个钱包用 getSignaturesForAddress 从最新的交易向前翻页，直到早于该钱包最后处理的 slot，
+    得到的签名按时间正序交给正常的处理流程（与实时通知一起经过去重过滤）。
+    固定数量的工作任务并发处理各个钱包，请求按令牌桶限速，补齐耗时约为
+    钱包数 × 请求延迟 / 并发数，而不是逐个钱包串行。
+    """
+
+    def __init__(self, rpc: RpcPool, concurrency: int = config.BACKFILL_CONCURRENCY,
+                 rate: float = config.BACKFILL_RPS, page_size: int = config.BACKFILL_PAGE_SIZE,
+                 max_pages: int = config.BACKFILL_MAX_PAGES, commitment: str = config.TX_COMMITMENT):
+        self.rpc = rpc
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.commitment = commitment
+        self.limiter = RateLimiter(rate)
+
+    async def signatures_since(self, address: str, since_slot: int) -> List[SignatureNotice]:
+        """钱包在 since_slot 及之后的成功交易，按 slot 倒序"""
+        notices: List[SignatureNotice] = []
+        before: Optional[Signature] = None
+        account = Pubkey.from_string(address)
+        for _ in range(self.max_pages):
+            await self.limiter.acquire()
+            response = await self.rpc.call(lambda client: client.get_signatures_for_address(
+                account, before=before, limit=self.page_size, commitment=self.commitment
+            ))
+            page = response.value
+            for item in page:
+                # 与最后处理的 slot 相同的交易也取回，由去重过滤
+                if item.slot < since_slot:
+                    return notices
+                if item.err is None:
+                    notices.append(SignatureNotice(str(item.signature), item.slot, address))
+            if len(page) < self.page_size:
+                return notices
+            before = page[-1].signature
+        logger.warning("补齐交易达到翻页上限", extra={"wallet": address, "signatures": len(notices)})
+        return notices
+
+    async def run(self, since: Dict[str, int], emit: Callable[[SignatureNotice], Awaitable[None]]) -> int:
+        """补齐一组钱包（地址 -> 最后处理的 slot），返回交给处理流程的签名数量"""
+        if not since:
+            return 0
+        started = time.monotonic()
+        items = iter(since.items())
+        counts = {"signatures": 0, "failed": 0}
+
+        async def worker():
+            # 各工作任务共享同一个迭代器，取下一个钱包时不会切换任务
+            for address, slot in items:
+                try:
+                    notices = await self.signatures_since(address, slot)
+                except Exception as e:
+                    counts["failed"] += 1
+                    ERRORS.labels("backfill").inc()
+                    logger.warning("补齐交易错误", extra={"wallet": address, "error": str(e)})
+                    continue
+                for notice in reversed(notices):
+                    await emit(notice)
+                counts["signatures"] += len(notices)
+                BACKFILL_SIGNATURES.inc(len(notices))
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(since)))))
+        logger.info("补齐交易完成", extra={
+            "wallets": len(since), "signatures": counts["signatures"], "failed": counts["failed"],
+            "seconds": round(time.monotonic() - started, 2)
+        })
+        return counts["signatures"]
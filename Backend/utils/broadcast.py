@@ -0,0 +1,93 @@
+import asyncio
+import json
+from typing import Dict, Iterable, Optional, Set
+from . import config
+
+
+class FeedSubscriber:
+    """一个实时动态的订阅者，持有有界的待发送消息队列"""
+
+    def __init__(self, maxsize: int, wallets: Optional[Set[str]] = None, tokens: Optional[Set[str]] = None):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.wallets = wallets or None  # 钱包地址过滤
+        self.tokens = tokens or None  # 代币地址过滤
+        self.evicted = False  # 消费过慢被移除
+
+    def matches_token(self, token_address: str) -> bool:
+        return self.tokens is None or token_address in self.tokens
+
+
+class BroadcastHub:
+    """进程内的交易动态广播
+
+    每个事件只序列化一次；订阅者按过滤条件建立索引，发布时只访问匹配的订阅者。
+    订阅者队列已满时直接移除（慢消费者淘汰），不会阻塞发布方。
+    """
+
+    def __init__(self, client_buffer: int = 1000):
+        self.client_buffer = client_buffer
+        self._all: Set[FeedSubscriber] = set()  # 没有过滤条件
+        self._by_wallet: Dict[str, Set[FeedSubscriber]] = {}  # 按钱包过滤（可同时按代币过滤）
+        self._by_token: Dict[str, Set[FeedSubscriber]] = {}  # 只按代币过滤
+        self.published = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        subscribers = set(self._all)
+        for group in (self._by_wallet, self._by_token):
+            for subs in group.values():
+                subscribers.update(subs)
+        return len(subscribers)
+
+    def subscribe(self, wallets: Optional[Iterable[str]] = None,
+                  tokens: Optional[Iterable[str]] = None) -> FeedSubscriber:
+        subscriber = FeedSubscriber(self.client_buffer, set(wallets or ()), set(tokens or ()))
+        if subscriber.wallets:
+            for wallet in subscriber.wallets:
+                self._by_wallet.setdefault(wallet, set()).add(subscriber)
+        elif subscriber.tokens:
+            for token in subscriber.tokens:
+                self._by_token.setdefault(token, set()).add(subscriber)
+        else:
+            self._all.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: FeedSubscriber):
+        self._all.discard(subscriber)
+        for group, keys in ((self._by_wallet, subscriber.wallets), (self._by_token, subscriber.tokens)):
+            for key in keys or ():
+                subs = group.get(key)
+                if subs is not None:
+                    subs.discard(subscriber)
+                    if not subs:
+                        del group[key]
+
+    def _evict(self, subscriber: FeedSubscriber):
+        subscriber.evicted = True
+        self.unsubscribe(subscriber)
+        self.evicted += 1
+
+    def publish(self, event: Dict):
+        """发布一个事件，事件需要包含 wallet_address 和 token_address"""
+        wallet_address = event.get("wallet_address")
+        token_address = event.get("token_address")
+
+        targets = set(self._all)
+        for subscriber in self._by_wallet.get(wallet_address, ()):
+            if subscriber.matches_token(token_address):
+                targets.add(subscriber)
+        targets.update(self._by_token.get(token_address, ()))
+        if not targets:
+            return
+
+        payload = json.dumps(event, default=str)
+        self.published += 1
+        for subscriber in targets:
+            try:
+                subscriber.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self._evict(subscriber)
+
+
+# 进程内共享的交易动态广播，监控器发布、API 订阅
+feed_hub = BroadcastHub(config.FEED_CLIENT_BUFFER)
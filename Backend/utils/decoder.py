@@ -0,0 +1,257 @@
+from typing import Any, Container, Dict, List, NamedTuple, Optional, Tuple, Union
+import msgspec
+
+# WebSocket 消息的类型化解码
+# 只声明处理需要的字段，其余字段在解码时直接跳过，不会构造中间字典
+
+
+class TokenAmount(msgspec.Struct):
+    amount: str = "0"
+    decimals: int = 0
+    uiAmount: Optional[float] = None
+
+
+class TokenAccountInfo(msgspec.Struct):
+    owner: Optional[str] = None
+    mint: Optional[str] = None
+    tokenAmount: Optional[TokenAmount] = None
+
+
+class ParsedAccount(msgspec.Struct):
+    info: Optional[TokenAccountInfo] = None
+
+
+class AccountData(msgspec.Struct):
+    parsed: Optional[ParsedAccount] = None
+
+
+# jsonParsed 无法解析的账户数据会以 [数据, 编码] 数组或字符串返回
+Data = Union[AccountData, List[Any], str, None]
+
+
+class Account(msgspec.Struct):
+    data: Data = None
+
+
+class NotificationValue(msgspec.Struct):
+    # programNotification: {"pubkey": ..., "account": {...}}
+    pubkey: Optional[str] = None
+    account: Optional[Account] = None
+    # accountNotification: value 本身就是账户
+    data: Data = None
+    # logsNotification: {"signature": ..., "err": ..., "logs": [...]}
+    signature: Optional[str] = None
+    err: Any = None
+
+
+class Context(msgspec.Struct):
+    slot: int = 0
+
+
+class NotificationResult(msgspec.Struct):
+    context: Context = msgspec.field(default_factory=Context)
+    value: Optional[NotificationValue] = None
+
+
+class NotificationParams(msgspec.Struct):
+    result: Optional[NotificationResult] = None
+    subscription: Optional[int] = None
+
+
+class Message(msgspec.Struct):
+    """JSON-RPC 消息：通知带 method/params，请求响应带 id/result/error"""
+    method: Optional[str] = None
+    params: Optional[NotificationParams] = None
+    id: Union[int, str, None] = None
+    result: Any = None
+    error: Any = None
+
+
+class AccountUpdate(NamedTuple):
+    """处理阶段需要的代币账户变化字段"""
+    pubkey: Optional[str]
+    owner: str
+    mint: str
+    ui_amount: float
+    slot: int
+    subscription: Optional[int] = None
+    amount: int = 0  # 最小单位的余额，与 decimals 一起精确比较
+    decimals: int = 0
+
+
+class SignatureNotice(NamedTuple):
+    """logsNotification 中的交易签名，wallet 为订阅对应的钱包地址"""
+    signature: str
+    slot: int
+    wallet: Optional[str] = None
+    subscription: Optional[int] = None
+    attempts: int = 0  # 已经尝试获取交易的次数
+
+
+# getTransaction 的结果，只解码代币余额相关字段
+
+
+class TokenBalance(msgspec.Struct):
+    accountIndex: int = 0
+    mint: Optional[str] = None
+    owner: Optional[str] = None
+    uiTokenAmount: Optional[TokenAmount] = None
+
+
+class LoadedAddresses(msgspec.Struct):
+    writable: List[str] = []
+    readonly: List[str] = []
+
+
+class TransactionMeta(msgspec.Struct):
+    err: Any = None
+    preTokenBalances: Optional[List[TokenBalance]] = None
+    postTokenBalances: Optional[List[TokenBalance]] = None
+    # v0 交易通过地址查找表加载的账户，排在 accountKeys 之后
+    loadedAddresses: Optional[LoadedAddresses] = None
+
+
+class TransactionMessage(msgspec.Struct):
+    accountKeys: List[str] = []
+
+
+class TransactionBody(msgspec.Struct):
+    message: Optional[TransactionMessage] = None
+
+
+class TransactionResult(msgspec.Struct):
+    slot: int = 0
+    blockTime: Optional[int] = None
+    meta: Optional[TransactionMeta] = None
+    transaction: Optional[TransactionBody] = None
+
+    def account_keys(self) -> List[str]:
+        """按 accountIndex 排列的全部账户地址"""
+        keys = list(self.transaction.message.accountKeys) if self.transaction and self.transaction.message else []
+        loaded = self.meta.loadedAddresses if self.meta is not None else None
+        if loaded is not None:
+            keys.extend(loaded.writable)
+            keys.extend(loaded.readonly)
+        return keys
+
+
+class RpcResponse(msgspec.Struct):
+    id: Union[int, str, None] = None
+    result: Optional[TransactionResult] = None
+    error: Any = None
+
+
+class TokenDelta(NamedTuple):
+    """一笔交易中某个钱包某个代币的余额变化"""
+    signature: str
+    owner: str
+    mint: str
+    pre: float
+    post: float
+    slot: int
+    block_time: Optional[int]
+    # 涉及的代币账户及其交易后余额（最小单位）和精度
+    accounts: Tuple[Tuple[str, int, int], ...] = ()
+
+
+_decoder = msgspec.json.Decoder(Message)
+_batch_decoder = msgspec.json.Decoder(List[RpcResponse])
+
+
+def decode_message(raw: Union[str, bytes]) -> Message:
+    return _decoder.decode(raw)
+
+
+def to_account_update(params: NotificationParams) -> Optional[AccountUpdate]:
+    """从通知中提取代币账户变化，不是已解析的代币账户时返回 None"""
+    result = params.result
+    if result is None or result.value is None:
+        return None
+    value = result.value
+    data = value.account.data if value.account is not None else value.data
+    if not isinstance(data, AccountData) or data.parsed is None or data.parsed.info is None:
+        return None
+
+    info = data.parsed.info
+    if info.owner is None or info.mint is None:
+        return None
+
+    amount = info.tokenAmount
+    return AccountUpdate(value.pubkey, info.owner, info.mint, _ui_amount(amount),
+                         result.context.slot, params.subscription,
+                         int(amount.amount) if amount is not None else 0,
+                         amount.decimals if amount is not None else 0)
+
+
+_ZERO_AMOUNT = TokenAmount()
+
+
+def _ui_amount(amount: Optional[TokenAmount]) -> float:
+    if amount is None:
+        return 0.0
+    if amount.uiAmount is not None:
+        return float(amount.uiAmount)
+    # 余额为 0 时部分节点返回 uiAmount: null
+    return int(amount.amount) / 10 ** amount.decimals
+
+
+def to_signature_notice(params: NotificationParams) -> Optional[SignatureNotice]:
+    """从 logsNotification 中提取交易签名，执行失败的交易返回 None"""
+    result = params.result
+    if result is None or result.value is None:
+        return None
+    value = result.value
+    if value.signature is None or value.err is not None:
+        return None
+    return SignatureNotice(value.signature, result.context.slot, subscription=params.subscription)
+
+
+def decode_rpc_batch(raw: Union[str, bytes]) -> List[RpcResponse]:
+    """解码批量 getTransaction 的响应数组"""
+    return _batch_decoder.decode(raw)
+
+
+def _balances(balances: Optional[List[TokenBalance]],
+              owners: Container[str]) -> Dict[Tuple[str, str], Dict[int, TokenAmount]]:
+    """(owner, mint) -> {accountIndex: 余额}"""
+    result: Dict[Tuple[str, str], Dict[int, TokenAmount]] = {}
+    for balance in balances or ():
+        if balance.owner is None or balance.mint is None or balance.owner not in owners:
+            continue
+        result.setdefault((balance.owner, balance.mint), {})[balance.accountIndex] = (
+            balance.uiTokenAmount or _ZERO_AMOUNT)
+    return result
+
+
+def token_deltas(signature: str, transaction: TransactionResult, owners: Container[str]) -> List[TokenDelta]:
+    """按 pre/postTokenBalances 计算 owners 中每个钱包每个代币的余额变化
+
+    同一钱包同一代币的多个代币账户合并计算；交易前或交易后没有该代币账户时余额按 0 计算
+    （新建或关闭代币账户）。
+    """
+    meta = transaction.meta
+    if meta is None:
+        return []
+    pre = _balances(meta.preTokenBalances, owners)
+    post = _balances(meta.postTokenBalances, owners)
+    keys = None
+    deltas = []
+    for key in pre.keys() | post.keys():
+        pre_accounts, post_accounts = pre.get(key, {}), post.get(key, {})
+        before = sum(_ui_amount(amount) for amount in pre_accounts.values())
+        after = sum(_ui_amount(amount) for amount in post_accounts.values())
+        if before == after:
+            continue
+        if keys is None:
+            keys = transaction.account_keys()
+        accounts = []
+        for index in pre_accounts.keys() | post_accounts.keys():
+            if index >= len(keys):
+                continue
+            # 交易后关闭的账户余额为 0，精度取交易前的
+            amount = post_accounts.get(index)
+            decimals = (amount if amount is not None else pre_accounts[index]).decimals
+            accounts.append((keys[index], int(amount.amount) if amount is not None else 0, decimals))
+        deltas.append(TokenDelta(signature, key[0], key[1], before, after,
+                                 transaction.slot, transaction.blockTime, tuple(accounts)))
+    return deltas
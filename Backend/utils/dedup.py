@@ -0,0 +1,32 @@
+from collections import OrderedDict
+from typing import Hashable
+
+
+class RecentFilter:
+    """有界的最近事件集合（LRU），在处理和写入数据库之前丢弃重复事件
+
+    重连后节点重发的账户状态、多个钱包订阅收到的同一笔交易都会在这里被过滤；
+    超出容量时淘汰最久未出现的事件，更早的重复由数据库的冲突忽略写入兜底。
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._keys: "OrderedDict[Hashable, None]" = OrderedDict()
+        self.duplicates = 0  # 被过滤的重复事件数量
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def add(self, key: Hashable) -> bool:
+        """记录一个事件，最近已经出现过时返回 False"""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            self.duplicates += 1
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+        return True
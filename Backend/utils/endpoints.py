@@ -0,0 +1,136 @@
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, TypeVar, Union
+from urllib.parse import urlsplit
+from solana.rpc.async_api import AsyncClient
+from . import config
+from .log import get_logger
+from .metrics import ENDPOINT_FAILURES, ENDPOINT_LATENCY
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# 延迟和错误率的指数滑动平均系数
+_ALPHA = 0.2
+# 还没有延迟样本的端点按这个延迟估计，保证会被尝试
+_UNKNOWN_LATENCY = 0.05
+
+
+class Endpoint:
+    """一个节点地址及其健康状态"""
+
+    def __init__(self, url: str, pool: str):
+        self.url = url
+        # 日志和指标只显示主机名，不泄露 URL 中的 API key
+        self.name = urlsplit(url).netloc or url
+        self.latency: Optional[float] = None  # 延迟的滑动平均（秒）
+        self.error_rate = 0.0  # 失败率的滑动平均
+        self.failures = 0  # 连续失败次数，决定退避时长
+        self.cooldown_until = 0.0  # 退避结束时间（monotonic）
+        self._latency_metric = ENDPOINT_LATENCY.labels(pool, self.name)
+        self._failures_metric = ENDPOINT_FAILURES.labels(pool, self.name)
+
+    def available_in(self, now: Optional[float] = None) -> float:
+        """距离退避结束还有多少秒，0 表示可用"""
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.cooldown_until - now)
+
+    @property
+    def score(self) -> float:
+        """越小越好：延迟按失败率加权"""
+        latency = self.latency if self.latency is not None else _UNKNOWN_LATENCY
+        return latency * (1 + 10 * self.error_rate)
+
+
+class EndpointPool:
+    """一组可互相替代的节点地址（WebSocket 或 HTTP）
+
+    - 每次连接或请求后更新延迟和失败率的滑动平均，选择时取可用端点中得分最好的一个
+    - 失败后按连续失败次数指数退避（带随机抖动），退避期间不选择该端点；
+      有其他可用端点时立即切换，不需要等待
+    - 配置顺序即优先级：得分相同时选择靠前的端点
+    """
+
+    def __init__(self, urls: Iterable[str], name: str,
+                 backoff_base: float = config.ENDPOINT_BACKOFF_BASE,
+                 backoff_max: float = config.ENDPOINT_BACKOFF_MAX):
+        self.name = name
+        self.endpoints: List[Endpoint] = [Endpoint(url, name) for url in dict.fromkeys(urls)]
+        if not self.endpoints:
+            raise ValueError(f"{name} 没有配置节点地址")
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def best(self, exclude: Sequence[Endpoint] = ()) -> Endpoint:
+        """得分最好的可用端点；全部在退避中时返回最早结束退避的端点"""
+        candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+        now = time.monotonic()
+        available = [e for e in candidates if e.available_in(now) == 0]
+        if available:
+            return min(available, key=lambda e: e.score)
+        return min(candidates, key=lambda e: e.cooldown_until)
+
+    def record_success(self, endpoint: Endpoint, latency: float):
+        endpoint.latency = latency if endpoint.latency is None else (
+            (1 - _ALPHA) * endpoint.latency + _ALPHA * latency)
+        endpoint.error_rate *= 1 - _ALPHA
+        endpoint.failures = 0
+        endpoint._latency_metric.set(endpoint.latency)
+
+    def record_latency(self, endpoint: Endpoint, latency: float):
+        """已连接期间的延迟样本（如订阅请求的往返时间），不影响失败计数"""
+        endpoint.latency = latency if endpoint.latency is None else (
+            (1 - _ALPHA) * endpoint.latency + _ALPHA * latency)
+        endpoint._latency_metric.set(endpoint.latency)
+
+    def record_failure(self, endpoint: Endpoint) -> float:
+        """记录一次失败，返回该端点的退避时长"""
+        endpoint.failures += 1
+        endpoint.error_rate = (1 - _ALPHA) * endpoint.error_rate + _ALPHA
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (endpoint.failures - 1))
+        delay *= random.uniform(0.5, 1.5)
+        endpoint.cooldown_until = time.monotonic() + delay
+        endpoint._failures_metric.inc()
+        return delay
+
+
+class RpcPool:
+    """多个 HTTP RPC 节点，每个节点一个 AsyncClient（各自的连接池）
+
+    call() 在得分最好的节点上执行请求，失败时记录并立即换到下一个节点重试，
+    每个节点最多尝试一次。
+    """
+
+    def __init__(self, urls: Union[str, Iterable[str]], timeout: float = config.RPC_TIMEOUT):
+        urls = [urls] if isinstance(urls, str) else list(urls)
+        self.pool = EndpointPool(urls, "rpc")
+        self.clients: Dict[str, AsyncClient] = {
+            endpoint.url: AsyncClient(endpoint.url, timeout=timeout) for endpoint in self.pool.endpoints
+        }
+
+    async def call(self, request: Callable[[AsyncClient], Awaitable[T]]) -> T:
+        tried: List[Endpoint] = []
+        while True:
+            endpoint = self.pool.best(exclude=tried)
+            tried.append(endpoint)
+            started = time.perf_counter()
+            try:
+                result = await request(self.clients[endpoint.url])
+            except Exception as e:
+                delay = self.pool.record_failure(endpoint)
+                if len(tried) >= len(self.pool):
+                    raise
+                logger.warning("RPC 请求失败，切换节点", extra={
+                    "endpoint": endpoint.name, "backoff": round(delay, 2), "error": str(e) or repr(e)
+                })
+                continue
+            self.pool.record_success(endpoint, time.perf_counter() - started)
+            return result
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.close()
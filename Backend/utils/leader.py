@@ -0,0 +1,113 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from . import async_crud, config
+from .log import get_logger
+from .metrics import metrics, ERRORS
+
+logger = get_logger(__name__)
+
+
+class LeaderLease:
+    """基于数据库租约行的主实例选举
+
+    - 主实例每 renew_interval 秒续约一次，租约有效期为 ttl 秒
+    - 备用实例每 retry_interval 秒尝试获取租约，主实例退出或停止续约后最多 ttl 秒接管
+    - 续约被拒绝（租约已被接管），或距离上次成功续约接近 ttl（数据库不可用）时，
+      主实例先停止任务，保证在其他实例能接管之前退出
+    - 任务停止时的收尾写入不能超过 remaining()：租约已被接管时为 0，否则留出一个续约间隔的余量
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, name: str, holder: Optional[str] = None,
+                 ttl: float = config.LEADER_LEASE_TTL,
+                 renew_interval: float = config.LEADER_RENEW_INTERVAL,
+                 retry_interval: float = config.LEADER_RETRY_INTERVAL):
+        if renew_interval >= ttl:
+            raise ValueError("续约间隔必须小于租约有效期")
+        self.session_factory = session_factory
+        self.name = name
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self._expires_at = 0.0  # 按本机单调时钟估计的租约到期时间（发起续约的时间加 ttl）
+        metrics.gauge("solmon_leader", "本实例是否持有监控租约", fn=lambda: 1 if self.is_leader else 0)
+
+    async def _acquire(self, timeout: Optional[float] = None) -> Optional[bool]:
+        """获取或续约租约，数据库错误或超时（默认一个续约间隔）时返回 None"""
+        started = time.monotonic()
+        try:
+            # 数据库卡住时也要按时检查租约期限，不能一直等待
+            acquired = await asyncio.wait_for(self._acquire_once(), timeout or self.renew_interval)
+        except Exception as e:
+            ERRORS.labels("lease").inc()
+            logger.error("获取租约错误", extra={"lease": self.name, "error": str(e)})
+            return None
+        # 数据库按收到请求的时间计算到期时间，这里按发起请求的时间估计，不会晚于实际到期
+        self._expires_at = started + self.ttl if acquired else 0.0
+        return acquired
+
+    def remaining(self) -> float:
+        """租约到期前还可以写入的时间（秒），留出一个续约间隔的余量；租约已被接管时为 0"""
+        return max(0.0, self._expires_at - self.renew_interval - time.monotonic())
+
+    async def _acquire_once(self) -> bool:
+        async with self.session_factory() as db:
+            return await async_crud.acquire_lease(db, self.name, self.holder, self.ttl)
+
+    async def _release_once(self):
+        async with self.session_factory() as db:
+            await async_crud.release_lease(db, self.name, self.holder)
+
+    async def release(self):
+        try:
+            await asyncio.wait_for(self._release_once(), self.renew_interval)
+        except Exception as e:
+            ERRORS.labels("lease").inc()
+            logger.error("释放租约错误", extra={"lease": self.name, "error": str(e)})
+
+    async def _hold(self, task: asyncio.Task):
+        """持续续约直到任务结束或失去租约"""
+        while True:
+            # 续约失败时等待和续约请求都不超过剩余时间，保证在租约到期前一个续约间隔停止任务
+            done, _ = await asyncio.wait({task}, timeout=min(self.renew_interval, self.remaining()))
+            if done:
+                return
+            acquired = None
+            if self.remaining() > 0:
+                acquired = await self._acquire(min(self.renew_interval, self.remaining()))
+            if acquired is False:
+                logger.warning("租约已被其他实例接管", extra={"lease": self.name, "holder": self.holder})
+                return
+            if not acquired and self.remaining() <= 0:
+                logger.warning("无法续约，主动退出", extra={"lease": self.name, "holder": self.holder})
+                return
+
+    async def run(self, start: Callable[[], Awaitable[None]]):
+        """作为备用实例等待租约，成为主实例后运行 start()；失去租约或任务退出后重新等待"""
+        logger.info("等待成为主实例", extra={"lease": self.name, "holder": self.holder})
+        while True:
+            if not await self._acquire():
+                await asyncio.sleep(self.retry_interval)
+                continue
+
+            logger.info("成为主实例", extra={"lease": self.name, "holder": self.holder})
+            self.is_leader = True
+            task = asyncio.create_task(start())
+            try:
+                await self._hold(task)
+            finally:
+                self.is_leader = False
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await asyncio.shield(self.release())
+
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                ERRORS.labels("leader").inc()
+                logger.error("主实例任务异常退出", extra={"lease": self.name, "error": str(task.exception())})
+            await asyncio.sleep(self.retry_interval)
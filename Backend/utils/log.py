@@ -0,0 +1,69 @@
+import itertools
+import json
+import logging
+import sys
+from . import config
+
+# logging.LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class StructuredFormatter(logging.Formatter):
+    """把 extra 传入的字段追加为 key=value（text）或输出为一行 JSON（json）"""
+
+    def __init__(self, fmt: str = "text"):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+        self.json = fmt == "json"
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS}
+        if self.json:
+            payload = {
+                "ts": self.formatTime(record),
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": record.getMessage(),
+                **fields
+            }
+            if record.exc_info:
+                payload["exc"] = self.formatException(record.exc_info)
+            return json.dumps(payload, ensure_ascii=False, default=str)
+
+        line = super().format(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class Sampler:
+    """每 every 次调用返回一次 True，用于高频日志采样"""
+
+    def __init__(self, every: int):
+        self.every = max(1, every)
+        self._counter = itertools.count()
+
+    def __call__(self) -> bool:
+        return next(self._counter) % self.every == 0
+
+
+_configured = False
+
+
+def setup_logging(level: str = None, fmt: str = None):
+    """配置 utils 包的日志输出（只配置一次）"""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter(fmt or config.LOG_FORMAT))
+    logger = logging.getLogger("utils")
+    logger.addHandler(handler)
+    logger.setLevel((level or config.LOG_LEVEL).upper())
+    logger.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(name)
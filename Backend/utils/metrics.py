@@ -0,0 +1,224 @@
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 进程内指标注册表，以 Prometheus 文本格式导出
+# 记录一次只是一次加法或一次二分查找，不加锁（指标只在事件循环线程中更新）
+
+# 默认的延迟分桶（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values):
+        """按标签值取子指标；热路径上应提前取好并保存"""
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self._samples()]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """只增不减的计数器；也可以传入 fn 从已有的计数属性读取"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        if self.fn is not None:
+            return [f"{self.name} {_format_value(self.fn())}"]
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+                for key, child in self._children.items()]
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值；通常传入 fn，在导出时读取当前值"""
+    type = "gauge"
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class _Timer:
+    """with histogram.time(): ... 记录代码块耗时"""
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: _HistogramValue):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """按名称注册指标；同名重复注册返回已有的指标（gauge 的 fn 会被替换为最新的）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        elif kwargs.get("fn") is not None:
+            metric.fn = kwargs["fn"]
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                fn: Optional[Callable[[], float]] = None) -> Counter:
+        return self._register(Counter, name, documentation, labelnames, fn=fn)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              fn: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames, fn=fn)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Prometheus 文本格式 (text/plain; version=0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # 读取 gauge 回调失败时跳过该指标，不影响其他指标导出
+                continue
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共享的指标注册表
+metrics = MetricsRegistry()
+
+# 监控器与 API 的指标
+FRAMES_RECEIVED = metrics.counter("solmon_frames_received_total", "收到的 WebSocket 消息数", ["shard"])
+RECONNECTS = metrics.counter("solmon_reconnects_total", "WebSocket 重连次数", ["shard"])
+LANE_DEPTH = metrics.gauge("solmon_lane_queue_depth", "各处理通道中等待处理的消息数", ["lane"])
+EVENTS_PROCESSED = metrics.counter("solmon_events_processed_total", "处理的代币账户变化数")
+TRANSACTIONS_WRITTEN = metrics.counter("solmon_transactions_written_total", "写入数据库的交易数")
+ERRORS = metrics.counter("solmon_errors_total", "各阶段的错误数", ["stage"])
+DECODE_SECONDS = metrics.histogram("solmon_decode_seconds", "单条消息的解码耗时")
+TOKEN_RESOLVE_SECONDS = metrics.histogram("solmon_token_resolve_seconds", "每批代币信息解析耗时")
+DB_COMMIT_SECONDS = metrics.histogram("solmon_db_commit_seconds", "每批交易写入并提交的耗时")
+PRICE_FETCH_SECONDS = metrics.histogram("solmon_price_fetch_seconds", "每个批量价格请求的耗时")
+BACKFILL_SIGNATURES = metrics.counter("solmon_backfill_signatures_total", "断线后补齐的交易签名数")
+TX_FETCH_SECONDS = metrics.histogram("solmon_tx_fetch_seconds", "每个批量 getTransaction 请求的耗时")
+ENDPOINT_LATENCY = metrics.gauge("solmon_endpoint_latency_seconds", "节点延迟的滑动平均", ["pool", "endpoint"])
+ENDPOINT_FAILURES = metrics.counter("solmon_endpoint_failures_total", "节点连接或请求失败次数", ["pool", "endpoint"])
+REQUEST_SECONDS = metrics.histogram("solmon_http_request_seconds", "API 请求耗时",
+                                    ["method", "route", "status"])
+PORTFOLIO_REFRESH_SECONDS = metrics.histogram("solmon_portfolio_refresh_seconds", "每轮读取持仓和价格变化并重新估值的耗时")
@@ -0,0 +1,145 @@
+"""数据库结构迁移
+
+迁移按版本号顺序执行，已执行的版本记录在 schema_migrations 表中，每个版本只执行一次。
+导入本模块不会访问数据库：部署时运行一次
+
+    python -m utils.migrations
+
+或由 AUTO_MIGRATE 在 API / 监控进程启动时执行。新增迁移时在 MIGRATIONS 末尾追加，
+不修改已发布的迁移；第 1 版按当前模型建表，之后的迁移需要在新数据库上也能执行（已存在时跳过）。
+"""
+import argparse
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from . import config, models
+from .database import create_db_engine
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+_versions = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+# PostgreSQL 上多个进程同时启动时，用事务级 advisory lock 保证迁移只执行一次
+_LOCK_KEY = 0x736F6C6D
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _create_tables(conn: Connection):
+    # 新数据库创建全部表；已有数据库只补建缺少的表（如 leases），不修改已存在的表
+    models.Base.metadata.create_all(conn)
+
+
+def _unique_holdings(conn: Connection):
+    """旧数据库的 token_holdings 没有 (wallet_id, token_id) 唯一约束"""
+    name = "uq_token_holdings_wallet_token"
+    inspector = inspect(conn)
+    if (any(c["name"] == name for c in inspector.get_unique_constraints("token_holdings"))
+            or any(i["name"] == name for i in inspector.get_indexes("token_holdings"))):
+        return
+    # 同一钱包同一代币有多条持仓时保留最新写入的一条
+    conn.execute(text(
+        "DELETE FROM token_holdings WHERE id NOT IN "
+        "(SELECT MAX(id) FROM token_holdings GROUP BY wallet_id, token_id)"
+    ))
+    conn.execute(text(f"CREATE UNIQUE INDEX {name} ON token_holdings (wallet_id, token_id)"))
+
+
+def _create_indexes(conn: Connection):
+    # create_all 不会为已存在的表建索引，按模型补建缺少的索引
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _normalize_timestamps(conn: Connection):
+    """SQLite 中旧数据的时间没有微秒（"2024-03-18 14:30:00"），与 SQLAlchemy 写入的格式
+    按字符串比较时排序错误，统一补齐为 "2024-03-18 14:30:00.000000"
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    for table, column in (("transactions", "timestamp"), ("token_holdings", "last_updated"),
+                          ("tokens", "price_updated_at")):
+        conn.execute(text(f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19"))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "创建表", _create_tables),
+    Migration(2, "token_holdings 按 (wallet_id, token_id) 唯一", _unique_holdings),
+    Migration(3, "补建缺少的索引", _create_indexes),
+    Migration(4, "统一 SQLite 中的时间格式", _normalize_timestamps),
+    Migration(5, "持仓和价格更新时间索引", _create_indexes),
+    Migration(6, "代币账户余额表", _create_tables),
+]
+
+
+def applied_versions(conn: Connection) -> List[int]:
+    if not inspect(conn).has_table(_versions.name):
+        return []
+    return sorted(conn.execute(select(_versions.c.version)).scalars())
+
+
+def upgrade(conn: Connection) -> List[int]:
+    """在一个事务中执行尚未执行的迁移，返回本次执行的版本号"""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+    _versions.create(conn, checkfirst=True)
+    applied = set(applied_versions(conn))
+    executed = []
+    for migration in MIGRATIONS:
+        if migration.version in applied:
+            continue
+        logger.info("执行数据库迁移", extra={"version": migration.version, "description": migration.description})
+        migration.apply(conn)
+        conn.execute(_versions.insert().values(
+            version=migration.version, description=migration.description, applied_at=datetime.now()
+        ))
+        executed.append(migration.version)
+    return executed
+
+
+def migrate(engine: Engine) -> List[int]:
+    with engine.begin() as conn:
+        return upgrade(conn)
+
+
+async def migrate_async(engine: AsyncEngine) -> List[int]:
+    async with engine.begin() as conn:
+        return await conn.run_sync(upgrade)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="执行数据库迁移")
+    parser.add_argument("--url", default=config.DATABASE_URL, help="数据库 URL，默认使用 DATABASE_URL")
+    parser.add_argument("--status", action="store_true", help="只显示已执行和待执行的迁移")
+    args = parser.parse_args()
+
+    engine = create_db_engine(args.url)
+    try:
+        if args.status:
+            with engine.connect() as conn:
+                applied = set(applied_versions(conn))
+            for migration in MIGRATIONS:
+                state = "已执行" if migration.version in applied else "待执行"
+                print(f"{migration.version:>4} {state} {migration.description}")
+            return
+        executed = migrate(engine)
+        print(f"已执行迁移: {executed}" if executed else "数据库已是最新版本")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -25,7 +25,7 @@ class Token(Base):
     contract_address = Column(String, unique=True)  # 合约地址
     decimals = Column(Integer)  # 精度
     current_price = Column(Float)  # 当前价格
-    price_updated_at = Column(DateTime)  # 价格更新时间
+    price_updated_at = Column(DateTime, index=True)  # 价格更新时间
 
     # 关联
     transactions = relationship("Transaction", back_populates="token")
@@ -33,6 +33,11 @@ class Token(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    # 交易动态按 (timestamp, id) 倒序分页；钱包交易列表按钱包过滤后按时间倒序
+    __table_args__ = (
+        Index("ix_transactions_timestamp_id", "timestamp", "id"),
+        Index("ix_transactions_wallet_id_timestamp", "wallet_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     wallet_id = Column(Integer, ForeignKey("wallets.id"))
@@ -47,14 +52,36 @@ class Transaction(Base):
     wallet = relationship("Wallet", back_populates="transactions")
     token = relationship("Token", back_populates="transactions")
 
+class TokenAccount(Base):
+    __tablename__ = "token_accounts"
+    # 监控中钱包的代币账户余额，监控器重启后按代币账户预热（同一钱包同一代币可以有多个代币账户）
+    # 不设外键：删除钱包或代币时不需要先删除这里的记录
+
+    pubkey = Column(String, primary_key=True)  # 代币账户地址
+    wallet_id = Column(Integer, index=True)
+    token_id = Column(Integer)
+    amount = Column(String)  # 最小单位的余额（u64 可能超出 BIGINT 范围，按十进制字符串保存）
+    decimals = Column(Integer)  # 精度
+    last_updated = Column(DateTime)
+
+class Lease(Base):
+    __tablename__ = "leases"
+    # 主实例租约，同时只有一个持有者（见 utils/leader.py）
+
+    name = Column(String, primary_key=True)  # 租约名称，如 "monitor"
+    holder = Column(String)  # 当前持有者（主机名:进程号:随机后缀）
+    expires_at = Column(DateTime)  # 过期时间（UTC），过期后其他实例可以接管
+
 class TokenHolding(Base):
     __tablename__ = "token_holdings"
+    # 每个钱包的每种代币只有一条持仓记录
+    __table_args__ = (UniqueConstraint("wallet_id", "token_id", name="uq_token_holdings_wallet_token"),)
     
     id = Column(Integer, primary_key=True, index=True)
-    wallet_id = Column(Integer, ForeignKey("wallets.id"))
+    wallet_id = Column(Integer, ForeignKey("wallets.id"), index=True)
     token_id = Column(Integer, ForeignKey("tokens.id"))
     balance = Column(Float)  # 持仓数量
-    last_updated = Column(DateTime)  # 最后更新时间
+    last_updated = Column(DateTime, index=True)  # 最后更新时间（持仓估值按此增量读取）
     
     # 关联
     wallet = relationship("Wallet", back_populates="token_holdings")
@@ -1,264 +1,600 @@
-from datetime import datetime
-from solana.rpc.async_api import AsyncClient
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
 import asyncio
-import json
-from . import crud, models
-from typing import List, Dict
-import websockets
-import base58
-import aiohttp
-from spl.token.client import Token
-from spl.token.constants import TOKEN_PROGRAM_ID
-from solders.pubkey import Pubkey
+import logging
+from . import async_crud, config
+from .database import AsyncSessionLocal
+from .pipeline import IngestQueue, BatchWriter, PartitionedLanes
+from .registry import WalletRecord, WalletRegistry, wallet_registry
+from .subscriptions import SubscriptionManager, LOGS, PROGRAM
+from .transactions import TransactionFetcher
+from .endpoints import RpcPool
+from .dedup import RecentFilter
+from .accounts import AccountStore, pubkey_bytes
+from .backfill import Backfiller
+from .tokens import TokenResolver
+from .prices import PriceEngine
+from .leader import LeaderLease
+from .replay import FrameRecorder
+from .broadcast import BroadcastHub, feed_hub
+from .rollups import RollupStore, WINDOWS, rollups
+from .decoder import AccountUpdate, SignatureNotice, TokenDelta, token_deltas
+from .log import get_logger
+from .metrics import metrics, ERRORS, EVENTS_PROCESSED, TOKEN_RESOLVE_SECONDS, TRANSACTIONS_WRITTEN
+from typing import Callable, List, Dict, Optional, Set, Tuple, Union
+
+# Raydium V4 AMM Program ID
+RAYDIUM_V4_PROGRAM_ID = "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8"
+# Helius WebSocket（需要添加 API key）
+HELIUS_WS_URL = "wss://mainnet.helius-rpc.com/?api-key=6f5e8e8c-5e87-43c4-bbfa-b733a13d81da"
+
+# 接收模式，见 config.INGEST_MODE
+ACCOUNT_MODE = "account"
+SIGNATURE_MODE = "signature"
+INGEST_MODES = (ACCOUNT_MODE, SIGNATURE_MODE)
+
+# 重试可能成功的写入错误（连接断开、数据库暂时不可用或被锁），其余错误重试也不会成功
+TRANSIENT_WRITE_ERRORS = (OperationalError, InterfaceError, DisconnectionError, OSError, asyncio.TimeoutError)
+
+logger = get_logger(__name__)
 
 
 class SolanaMonitor:
-    def __init__(self, db: Session, rpc_url: str = "https://api.mainnet-beta.solana.com"):
-        self.db = db
-        self.client = AsyncClient(rpc_url)
-        self.wallets = []
-        self.ws_url = rpc_url.replace('https', 'wss')
-        self.token_cache = {}  # 缓存代币信息
+    def __init__(self, session_factory: async_sessionmaker = AsyncSessionLocal,
+                 rpc_url: Union[str, List[str]] = config.SOLANA_RPC_URLS,
+                 registry: WalletRegistry = wallet_registry,
+                 ws_url: Union[str, List[str], None] = None,
+                 hub: Optional[BroadcastHub] = feed_hub,
+                 rollup_store: Optional[RollupStore] = rollups,
+                 mode: str = config.INGEST_MODE,
+                 drain_budget: Optional[Callable[[], float]] = None):
+        if mode not in INGEST_MODES:
+            raise ValueError(f"未知的接收模式: {mode}")
+        # 每次数据库操作使用独立的异步会话，避免长期持有一个会话
+        self.session_factory = session_factory
+        self.mode = mode
+        # 多个 RPC 节点按延迟和失败率选择，失败时切换节点
+        self.rpc = RpcPool(rpc_url)
+        # 批量 getTransaction，复用各节点的连接池
+        self.fetcher = TransactionFetcher(self.rpc)
+        # 重连后补齐断线期间的交易
+        self.backfiller = Backfiller(self.rpc)
+        self.backfill_enabled = config.BACKFILL_ENABLED
+        self._backfill_tasks: Set[asyncio.Task] = set()
+        self.registry = registry  # 按地址索引的钱包注册表
+        # 实时交易动态广播和排行榜的滑动窗口汇总；为 None 时由 API 进程从数据库追踪（utils/tailer.py）
+        self.hub = hub
+        self.rollups = rollup_store
+        # 多个 WebSocket 节点由订阅管理器的节点池选择
+        self.ws_url = ws_url or config.SOLANA_WS_URLS or HELIUS_WS_URL
+        # 代币信息解析（共享连接池、合并并发请求、带 TTL 的 LRU 缓存）
+        self.tokens = TokenResolver(
+            session_factory,
+            max_size=config.TOKEN_CACHE_SIZE,
+            ttl=config.TOKEN_CACHE_TTL,
+            negative_ttl=config.TOKEN_NEGATIVE_TTL,
+            concurrency=config.TOKEN_FETCH_CONCURRENCY
+        )
+        # 后台刷新的代币价格表，处理阶段只查字典，不发网络请求
+        self.prices = PriceEngine(session_factory)
+        # 代币账户公钥 -> 最近一次余额（最小单位）和账户通知报告的 slot，数组存储，监控大量账户时内存占用小；
+        # 启动时从 token_accounts 预热
+        self.account_states = AccountStore()
+        # (wallet_id, token_id) -> 余额（该钱包该代币全部代币账户的合计），启动时从 token_holdings 预热
+        self.holdings = {}
+        # (wallet_id, token_id) -> account_states 中已知代币账户的余额合计，持仓中超出的部分属于还没见到的账户
+        self.account_totals: Dict[Tuple[int, int], float] = {}
+        # (wallet_id, token_id) -> 持仓最后一次变化的 slot，补齐的旧交易不会覆盖更新的持仓
+        self.holding_slots: Dict[Tuple[int, int], int] = {}
+        # 钱包地址 -> 最后处理的 slot，重连后从这里开始补齐
+        self.wallet_slots: Dict[str, int] = {}
+        # 接收循环只负责入队，处理与批量写入在独立任务中进行
+        self.queue = IngestQueue(config.INGEST_QUEUE_SIZE, config.INGEST_OVERFLOW)
+        # 最近处理过的事件，重连后重发的通知和多个订阅收到的同一笔交易在这里丢弃
+        self.recent_events = RecentFilter(config.DEDUP_CACHE_SIZE)
+        # 处理通道数量：同一钱包（及其代币账户）的事件按顺序处理，不同钱包并发处理
+        self.lanes = config.PROCESS_LANES
+        self.process_lanes: Optional[PartitionedLanes] = None
+        # 各通道处理后待写入的交易记录，由一个写入任务合并成批
+        self.pending_rows = IngestQueue(config.INGEST_QUEUE_SIZE)
+        self.writer = BatchWriter(session_factory)
+        self.batch_size = config.WRITE_BATCH_SIZE
+        self.flush_interval = config.WRITE_FLUSH_INTERVAL
+        self.wallet_sync_interval = config.WALLET_SYNC_INTERVAL
+        # 停止时处理并写入已接收消息的时间上限（秒），由主实例租约的剩余时间决定（见 LeaderLease.remaining）
+        self.drain_budget = drain_budget
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """当前状态以 gauge 回调导出，只在抓取 /api/metrics 时读取"""
+        metrics.gauge("solmon_queue_depth", "接收队列中等待处理的消息数", fn=self.queue.qsize)
+        metrics.gauge("solmon_write_queue_depth", "等待写入的交易记录数", fn=self.pending_rows.qsize)
+        metrics.counter("solmon_queue_dropped_total", "队列满时丢弃的消息数", fn=lambda: self.queue.dropped)
+        metrics.gauge("solmon_token_cache_size", "代币信息缓存条目数", fn=lambda: len(self.tokens))
+        metrics.gauge("solmon_token_cache_hit_ratio", "代币信息缓存命中率", fn=self._token_hit_ratio)
+        metrics.gauge("solmon_price_table_size", "价格表中有价格的 mint 数", fn=lambda: len(self.prices))
+        metrics.gauge("solmon_account_states", "跟踪余额的代币账户数", fn=lambda: len(self.account_states))
+        metrics.counter("solmon_duplicates_dropped_total", "处理前丢弃的重复事件数",
+                        fn=lambda: self.recent_events.duplicates)
+        metrics.gauge("solmon_wallets", "监控中的钱包数", fn=lambda: len(self.registry))
+
+    def _token_hit_ratio(self) -> float:
+        lookups = self.tokens.hits + self.tokens.misses
+        return self.tokens.hits / lookups if lookups else 0.0
     
+    async def load_holdings(self):
+        """从 token_holdings 和 token_accounts 加载已保存的持仓和代币账户余额，作为账户状态的初始值"""
+        async with self.session_factory() as db:
+            holdings = await async_crud.get_all_holdings(db)
+            accounts = await async_crud.get_all_token_accounts(db)
+        self.holdings = {(h.wallet_id, h.token_id): h.balance for h in holdings}
+        self.account_totals = {}
+        for account in accounts:
+            amount = int(account.amount)
+            self.account_states.set(account.pubkey, amount, account.decimals)
+            key = (account.wallet_id, account.token_id)
+            self.account_totals[key] = self.account_totals.get(key, 0) + amount / 10 ** account.decimals
+        logger.info("已加载持仓记录", extra={"holdings": len(self.holdings), "accounts": len(accounts)})
+
+    async def load_rollups(self):
+        """用最大窗口内的已有交易重建滑动窗口汇总"""
+        since = datetime.now() - timedelta(seconds=max(WINDOWS.values()))
+        async with self.session_factory() as db:
+            transactions = await async_crud.get_transactions_since(db, since)
+        self.rollups.record_many(transactions)
+        logger.info("已重建滑动窗口汇总", extra={"transactions": len(transactions)})
+
     async def load_wallets(self):
         """从数据库加载需要监控的钱包"""
-        self.wallets = crud.get_wallets(self.db)
-        return [wallet.address for wallet in self.wallets]
+        async with self.session_factory() as db:
+            wallets = await async_crud.get_all_wallets(db)
+        self.registry.load(wallets)
+        return self.registry.addresses()
     
-    async def get_token_info(self, mint_address: str, pubkey: str):
-        """获取代币信息，如果数据库没有则从链上获取并保存"""
-        # 先从缓存中查找
-        if mint_address in self.token_cache:
-            print(f"从缓存中获取代币信息: {mint_address}")
-            return self.token_cache[mint_address]
-            
-        # 从数据库查找
-        token = crud.get_token_by_address(self.db, mint_address)
-        if token:
-            print(f"从数据库中获取代币信息: {mint_address}")
-            self.token_cache[mint_address] = token
-            return token
-            
-        try:
-            print(f"从链上获取代币信息: {mint_address}")
-             # 从 Jupiter API 获取代币信息
-            jupiter_url = f"https://api.phantom.app/search/v1?query={mint_address}&chainIds=solana%3A101&platform=extension&pageSize=50&searchTypes=fungible&searchContext=swapper&supportedNetworkIds=solana%3A101%2Ceip155%3A1%2Ceip155%3A137%2Ceip155%3A8453"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(jupiter_url) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        # 获取第一个结果
-                        results = data.get("results", [])
-                        if results and results[0].get("type") == "fungible":
-                            token_info = results[0].get("data", {}).get("data", {})
-                            
-                            if token_info:
-                                token_data = {
-                                    "contract_address": mint_address,
-                                    "decimals": token_info.get("decimals", 6),
-                                    "symbol": token_info.get("symbol", f"PUMP-{mint_address[:4]}"),
-                                    "name": token_info.get("name", f"Pump Token {mint_address[:8]}"),
-                                    "current_price": 0.0  # 价格需要从其他 API 获取
-                                }
-                            else:
-                                token_data = {
-                                    "contract_address": mint_address,
-                                    "decimals": 6,
-                                    "symbol": f"PUMP-{mint_address[:4]}",
-                                    "name": f"Pump Token {mint_address[:8]}",
-                                    "current_price": 0.0
-                                }
-            
-            token = crud.create_token(self.db, token_data)
-            self.token_cache[mint_address] = token
-            print(f"已创建新代币: {token.symbol} ({mint_address})")
-            return token
-               
-                
-        except Exception as e:
-            print(f"获取代币信息错误: {str(e)}")
-            token_data = {
-                "contract_address": mint_address,
-                "decimals": 6,
-                "symbol": f"RAY-{mint_address[:4]}",
-                "name": f"Raydium Token {mint_address[:8]}",
-                "current_price": 0.0
-            }
-            token = crud.create_token(self.db, token_data)
-            self.token_cache[mint_address] = token
-            return token
+    async def _sync_wallets(self):
+        """定期从数据库重新加载钱包，其他进程增删的钱包经注册表通知更新订阅"""
+        while True:
+            await asyncio.sleep(self.wallet_sync_interval)
+            try:
+                await self.load_wallets()
+            except Exception as e:
+                ERRORS.labels("sync").inc()
+                logger.error("同步钱包列表错误", extra={"error": str(e)})
 
     async def get_transaction_details(self, signature: str):
-        """获取交易详细信息"""
-        try:
-            tx_info = await self.client.get_transaction(
-                signature,
-                encoding="jsonParsed"
-            )
-            return tx_info
-        except Exception as e:
-            print(f"获取交易详情错误: {str(e)}")
-            return None
+        """获取交易详细信息（slot、blockTime 和代币余额），查不到时返回 None"""
+        return await self.fetcher.fetch(signature)
 
-    async def process_transaction(self, tx_data: Dict):
-        """处理交易数据并存储到数据库"""
-        try:
-            # 从 JSON 响应中获取关键信息
-            value = tx_data.get("result", {}).get("value", {})
-            pubkey = value.get("pubkey")
-            account = value.get("account", {})
-            parsed = account.get("data", {}).get("parsed", {})
-            
-            if not parsed:
-                return
+    def _seen_slot(self, address: str, slot: int):
+        if slot > self.wallet_slots.get(address, 0):
+            self.wallet_slots[address] = slot
 
-            token_info = parsed.get("info", {})
-            owner_address = token_info.get("owner")
-            mint_address = token_info.get("mint")
-            
-            print(f"处理交易: pubkey={pubkey}, owner={owner_address}, mint={mint_address}")
-            
+    def _set_account(self, key: Tuple[int, int], pubkey, amount: int, decimals: int,
+                     slot: Optional[int] = None) -> int:
+        """更新代币账户余额，持仓按该账户的变化调整，返回该账户原来的余额（最小单位）
+
+        第一次见到的代币账户以持仓中还没有归到已知账户的部分作为原来的余额：只有一个代币账户时
+        就是已保存的持仓，避免重启或重连后把全部余额记录成一笔买入；已知账户之外的新账户从 0 开始。
+        """
+        scale = 10 ** decimals
+        previous = self.account_states.get(pubkey)
+        if previous is None:
+            unattributed = self.holdings.get(key, 0) - self.account_totals.get(key, 0)
+            previous = round(max(unattributed, 0) * scale)
+            self.account_totals[key] = self.account_totals.get(key, 0) + previous / scale
+        self.account_states.set(pubkey, amount, decimals, slot)
+        change = (amount - previous) / scale
+        self.account_totals[key] = self.account_totals.get(key, 0) + change
+        self.holdings[key] = self.holdings.get(key, 0) + change
+        return previous
+
+    def _build_row(self, wallet: WalletRecord, token, tx_hash: str, previous_amount: float,
+                   current_amount: float, timestamp: datetime) -> dict:
+        """按余额变化生成待写入的交易记录"""
+        # 当代币数量增加时是买入，减少时是卖出
+        tx_type = "buy" if current_amount > previous_amount else "sell"
+        amount_change = abs(current_amount - previous_amount)
+
+        # 计算 USD 金额（价格表还没有该 mint 时使用数据库中的价格）
+        self.prices.touch(token.contract_address)
+        price = self.prices.get(token.contract_address)
+        if price is None:
+            price = token.current_price
+        usd_amount = amount_change * price if price else 0
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("检测到新交易", extra={
+                "tx_type": tx_type, "previous": previous_amount, "current": current_amount,
+                "change": amount_change, "symbol": token.symbol, "usd": usd_amount,
+                "wallet": wallet.address
+            })
+
+        return {
+            "tx_hash": tx_hash,
+            "amount": usd_amount,
+            "tx_type": tx_type,
+            "quantity": amount_change,
+            "timestamp": timestamp,
+            "wallet_id": wallet.id,
+            "token_id": token.id,
+            # 以下字段不写入数据库，用于实时动态推送
+            "wallet_address": wallet.address,
+            "wallet_name": wallet.name,
+            "token_address": token.contract_address,
+            "token_symbol": token.symbol
+        }
+
+    async def process_transaction(self, update: AccountUpdate):
+        """处理代币账户变化，返回待写入的交易记录（没有状态变化时返回 None）"""
+        try:
             # 查找对应的钱包
-            wallet = next((w for w in self.wallets if w.address == owner_address), None)
+            wallet = self.registry.get(update.owner)
             if not wallet:
                 return
+            self._seen_slot(update.owner, update.slot)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("处理交易", extra={"pubkey": update.pubkey, "owner": update.owner, "mint": update.mint})
 
             # 获取代币信息
-            token = await self.get_token_info(mint_address,pubkey)
+            token = await self.tokens.resolve(update.mint)
             if not token:
-                print(f"无法获取代币信息: {mint_address}")
+                logger.warning("无法获取代币信息", extra={"mint": update.mint})
                 return
 
-            # 获取代币数量信息
-            token_amount = token_info.get("tokenAmount", {})
-            current_amount = float(token_amount.get("uiAmount", 0))
-            
-            # 检查是否有状态变化
-            previous_amount = self.account_states.get(pubkey, 0)
-            if current_amount != previous_amount:
-                # 获取交易签名
-                slot = tx_data.get("result", {}).get("context", {}).get("slot", "")
-                tx_hash = f"{pubkey}_{slot}"
-                
-                # 当代币数量增加时是买入，减少时是卖出
-                tx_type = "buy" if current_amount > previous_amount else "sell"
-                amount_change = abs(current_amount - previous_amount)
-                
-                print(f"DEBUG: previous={previous_amount}, current={current_amount}, type={tx_type}, "
-                      f"change={amount_change} {'增加' if current_amount > previous_amount else '减少'}")
-                
-                # 计算 USD 金额
-                usd_amount = amount_change * token.current_price if token.current_price else 0
-                
-                transaction = {
-                    "tx_hash": tx_hash,
-                    "amount": usd_amount,
-                    "tx_type": tx_type,
-                    "quantity": amount_change,
-                    "timestamp": datetime.now(),
-                    "wallet_id": wallet.id,
-                    "token_id": token.id
-                }
-                
-                # 直接创建交易记录
-                crud.create_transaction(self.db, transaction)
-                print(f"新交易已记录: {tx_type} {amount_change} {token.symbol} "
-                      f"(价值: ${usd_amount:.2f}, 钱包: {wallet.address})")
-                
-                # 更新状态
-                self.account_states[pubkey] = current_amount
+            pubkey = update.pubkey
+            key = (wallet.id, token.id)
+            # 按最小单位检查是否有状态变化；通知中是该 slot 结束时的余额，记录 slot 供补齐的交易去重
+            previous = self._set_account(key, pubkey_bytes(pubkey), update.amount, update.decimals, update.slot)
+            if update.amount != previous:
+                self.holding_slots[key] = max(self.holding_slots.get(key, 0), update.slot)
+                row = self._build_row(wallet, token, f"{pubkey}_{update.slot}",
+                                      previous / 10 ** update.decimals, update.ui_amount, datetime.now())
+                # 代币账户余额与交易记录一起保存，重启后按账户预热
+                row["accounts"] = ((pubkey, update.amount, update.decimals),)
+                return row
             
         except Exception as e:
-            print(f"处理交易错误: {str(e)}")
-            self.db.rollback()
+            ERRORS.labels("process").inc()
+            logger.exception("处理交易错误", extra={"pubkey": update.pubkey, "error": str(e)})
 
-    async def start_monitoring(self):
-        print("start_monitoring-----------")
-        addresses = await self.load_wallets()
-        if not addresses:
-            print("没有要监控的钱包地址")
+    async def process_delta(self, delta: TokenDelta) -> Optional[dict]:
+        """处理一笔交易中的代币余额变化，返回待写入的交易记录"""
+        try:
+            wallet = self.registry.get(delta.owner)
+            if not wallet:
+                return None
+            token = await self.tokens.resolve(delta.mint)
+            if not token:
+                logger.warning("无法获取代币信息", extra={"mint": delta.mint})
+                return None
+            self._seen_slot(delta.owner, delta.slot)
+            key = (wallet.id, token.id)
+            stale = delta.slot < self.holding_slots.get(key, 0)
+            if self.mode == ACCOUNT_MODE and (stale or self._notified(delta)):
+                # 补齐的旧交易：之后（或同一 slot）的账户通知已经把这段余额变化合并记录
+                return None
+            if not stale:
+                self.holding_slots[key] = delta.slot
+                # 按交易后余额同步涉及的代币账户和持仓（交易可能只涉及该钱包该代币的部分代币账户）；
+                # account 模式下之后的账户通知只记录补齐之后的变化
+                for pubkey, amount, decimals in delta.accounts:
+                    self._set_account(key, pubkey, amount, decimals)
+            timestamp = datetime.fromtimestamp(delta.block_time) if delta.block_time else datetime.now()
+            # 一笔交易中同一钱包同一代币只有一条记录，签名相同的交易不会重复写入
+            row = self._build_row(wallet, token, f"{delta.signature}:{delta.owner}:{delta.mint}",
+                                  delta.pre, delta.post, timestamp)
+            if not stale:
+                row["accounts"] = delta.accounts
+            return row
+        except Exception as e:
+            ERRORS.labels("process").inc()
+            logger.exception("处理交易错误", extra={"signature": delta.signature, "error": str(e)})
+            return None
+
+    def _notified(self, delta: TokenDelta) -> bool:
+        """交易涉及的代币账户是否已经收到同一 slot 或更新的账户通知"""
+        for pubkey, _, _ in delta.accounts:
+            slot = self.account_states.slot(pubkey)
+            if slot is not None and slot >= delta.slot:
+                return True
+        return False
+
+    def _batch_mints(self, batch: List[AccountUpdate]) -> set:
+        return {update.mint for update in batch if update.owner in self.registry}
+
+    async def _process_updates(self, batch: List[AccountUpdate]) -> List[dict]:
+        """账户通知：比较代币账户余额"""
+        # 预先批量解析本批涉及的代币，并登记到价格表（第一笔交易前就开始维护价格）
+        mints = self._batch_mints(batch)
+        with TOKEN_RESOLVE_SECONDS.time():
+            await self.tokens.resolve_many(mints)
+        self.prices.track(mints)
+        rows = []
+        for update in batch:
+            # 同一账户同一 slot 的相同余额只处理一次
+            if not self.recent_events.add((update.pubkey, update.slot, update.ui_amount)):
+                continue
+            transaction = await self.process_transaction(update)
+            if transaction:
+                rows.append(transaction)
+        return rows
+
+    async def _process_signatures(self, batch: List[SignatureNotice]) -> List[dict]:
+        """签名通知（signature 模式和断线补齐）：批量获取交易，按 pre/postTokenBalances 计算余额变化"""
+        # 同一笔交易可能提到多个监控中的钱包，或在重连后重发，只获取一次；
+        # 重新入队的（attempts > 0）是本监控器的重试，不再过滤
+        notices: Dict[str, SignatureNotice] = {}
+        for notice in batch:
+            if notice.wallet not in self.registry:
+                continue
+            if notice.attempts == 0 and not self.recent_events.add(notice.signature):
+                continue
+            self._seen_slot(notice.wallet, notice.slot)
+            notices[notice.signature] = notice
+        if not notices:
+            return []
+
+        transactions = await self.fetcher.fetch_many(notices)
+        deltas = []
+        for signature, notice in notices.items():
+            transaction = transactions.get(signature)
+            if transaction is None:
+                self._retry(notice)
+                continue
+            if transaction.meta is None or transaction.meta.err is not None:
+                continue
+            deltas.extend(token_deltas(signature, transaction, self.registry))
+        if not deltas:
+            return []
+
+        mints = {delta.mint for delta in deltas}
+        with TOKEN_RESOLVE_SECONDS.time():
+            await self.tokens.resolve_many(mints)
+        self.prices.track(mints)
+        # 按 slot 顺序处理，持仓保留最新的交易后余额
+        deltas.sort(key=lambda delta: delta.slot)
+        rows = []
+        for delta in deltas:
+            transaction = await self.process_delta(delta)
+            if transaction:
+                rows.append(transaction)
+        return rows
+
+    def _retry(self, notice: SignatureNotice):
+        """节点还查不到的交易稍后重新入队，超过重试次数后放弃"""
+        if notice.attempts >= config.TX_FETCH_RETRIES:
+            ERRORS.labels("fetch").inc()
+            logger.warning("放弃获取交易", extra={"signature": notice.signature, "attempts": notice.attempts + 1})
             return
+        retry = notice._replace(attempts=notice.attempts + 1)
+        loop = asyncio.get_running_loop()
+        loop.call_later(config.TX_FETCH_RETRY_DELAY * retry.attempts,
+                        lambda: loop.create_task(self.queue.put(retry)))
 
-        # Raydium V4 AMM Program ID
-        RAYDIUM_V4_PROGRAM_ID = "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8"
-
-        monitor_addresses = [RAYDIUM_V4_PROGRAM_ID] + addresses
-        print(f"正在监控以下地址:")
-        for addr in monitor_addresses:
-            print(f"- {addr}")
-
-        # Helius 的订阅消息格式
-        subscription_message = {
-            "jsonrpc": "2.0",
-            "id": "420",
-            "method": "programSubscribe",
-            "params": [
-                RAYDIUM_V4_PROGRAM_ID,
-                {
-                    "commitment": "processed",
-                    "encoding": "jsonParsed",
-                    "filters": [{"memcmp": {"offset": 32, "bytes": addr}} for addr in addresses]
-                }
-            ]
-        }
+    @staticmethod
+    def _lane_key(event) -> str:
+        """按钱包分配通道：账户通知按代币账户的所有者，签名通知按订阅的钱包
 
+        补齐的签名要获取交易后才知道涉及哪些代币账户，按所有者分配时这些账户的余额变化
+        与它们的实时账户通知在同一通道中按顺序处理。
+        """
+        if isinstance(event, AccountUpdate):
+            return event.owner
+        return event.wallet or event.signature
 
-        self.account_states = {}
+    async def _process_batch(self, batch: list):
+        """处理一条通道中的一批消息，生成的交易记录交给写入任务"""
+        EVENTS_PROCESSED.inc(len(batch))
+        # account 模式下补齐的签名与账户通知在同一批中处理
+        updates = [event for event in batch if isinstance(event, AccountUpdate)]
+        notices = [event for event in batch if isinstance(event, SignatureNotice)]
+        rows = []
+        if updates:
+            rows.extend(await self._process_updates(updates))
+        if notices:
+            rows.extend(await self._process_signatures(notices))
+        for row in rows:
+            await self.pending_rows.put(row)
 
+    async def _write_batch(self, rows: List[dict]) -> List[dict]:
+        """在一个事务中写入一批交易记录及其持仓，返回实际新增的交易记录
+
+        这批记录对应的余额变化已经更新到内存中的持仓，丢弃会永久丢失交易并让数据库中的持仓落后：
+        暂时性的错误（连接断开、数据库不可用）按指数退避重试直到成功，重试期间写入队列积压，
+        处理通道和接收队列依次产生背压。重试也不会成功的错误（如钱包已被删除时的外键约束）
+        把这批拆开写入，只丢弃出错的记录，不阻塞其他钱包。
+        """
+        # 已经停止监控的钱包（API 中删除后同步到注册表）的记录不再写入
+        rows = [row for row in rows if self._wallet_exists(row)]
+        if not rows:
+            return []
+        delay = config.WRITE_RETRY_DELAY
         while True:
+            # 每次重试时重新读取持仓：期间其他批次更新的持仓也写入最新值；
+            # 代币账户余额与交易在同一事务中保存，同一账户取这批中最后的余额
+            holdings, accounts = {}, {}
+            for row in rows:
+                key = (row["wallet_id"], row["token_id"])
+                if key in self.holdings:
+                    holdings[key] = self.holdings[key]
+                for pubkey, amount, decimals in row.get("accounts", ()):
+                    accounts[pubkey] = (row["wallet_id"], row["token_id"], amount, decimals)
             try:
-                # 连接 Helius WebSocket（需要添加 API key）
-                helius_ws_url = "wss://mainnet.helius-rpc.com/?api-key=6f5e8e8c-5e87-43c4-bbfa-b733a13d81da"
-                async with websockets.connect(helius_ws_url, ping_interval=30) as websocket:
-                    print(f"已连接到 Helius WebSocket")
-                    
-                    print(f"连接到 WebSocket URL: {helius_ws_url}")
-                    print(f"发送订阅消息: {json.dumps(subscription_message, indent=2)}")
-                    await websocket.send(json.dumps(subscription_message))
-                    initial_response = await websocket.recv()
-                    print(f"初始响应: {initial_response}")
-                    
-                    # 发送定期的 ping
-                    ping_task = asyncio.create_task(self._ping_websocket(websocket))
-                    
-                    while True:
-                        try:
-                            response = await websocket.recv()
-                            print(f"收到消息: {response}")
-                            transaction_data = json.loads(response)
-                            
-                            if "params" in transaction_data:
-                                await self.process_transaction(transaction_data["params"])
-                            
-                        except websockets.ConnectionClosed:
-                            print("WebSocket 连接已断开，准备重连...")
-                            if not ping_task.done():
-                                ping_task.cancel()
-                            break
-                        except Exception as e:
-                            print(f"处理消息错误: {str(e)}")
-                            continue
-                            
+                written = await self.writer.write(rows, holdings, accounts)
+            except TRANSIENT_WRITE_ERRORS as e:
+                ERRORS.labels("write").inc()
+                logger.exception("批量写入错误，稍后重试", extra={
+                    "batch": len(rows), "retry_in": round(delay, 2), "error": str(e)
+                })
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, config.WRITE_RETRY_MAX_DELAY)
+                continue
             except Exception as e:
-                print(f"连接错误: {str(e)}")
-                print("5秒后尝试重连...")
-                await asyncio.sleep(5)
+                ERRORS.labels("write").inc()
+                if len(rows) == 1:
+                    logger.exception("丢弃无法写入的交易记录", extra={
+                        "tx_hash": rows[0]["tx_hash"], "wallet_id": rows[0]["wallet_id"], "error": str(e)
+                    })
+                    return []
+                # 按顺序拆成两半分别写入，找出出错的记录
+                logger.warning("批量写入错误，拆分后重新写入", extra={"batch": len(rows), "error": str(e)})
+                middle = len(rows) // 2
+                return await self._write_batch(rows[:middle]) + await self._write_batch(rows[middle:])
+            # 代币账户余额只用于写入，不推送到实时动态
+            for row in rows:
+                row.pop("accounts", None)
+            return written
+
+    def _wallet_exists(self, row: dict) -> bool:
+        wallet = self.registry.get(row["wallet_address"])
+        return wallet is not None and wallet.id == row["wallet_id"]
 
-    async def _ping_websocket(self, websocket):
-        """定期发送 ping 以保持连接"""
+    async def _write_rows(self):
+        """合并各通道的交易记录，在一个事务中写入数据库，写入队列关闭并写完后返回"""
+        while True:
+            # 接收队列已经按 flush_interval 凑批，这里不再等待：提交期间各通道产生的记录合并到下一批
+            rows = await self.pending_rows.get_batch(self.batch_size, 0)
+            if not rows:
+                return
+            written = await self._write_batch(rows)
+            TRANSACTIONS_WRITTEN.inc(len(written))
+            logger.info("新交易已记录", extra={
+                "written": len(written), "batch": len(rows), "queue": self.queue.qsize()
+            })
+
+            if self.rollups is not None:
+                self.rollups.record_many(written)
+            # 已提交的交易推送到实时动态
+            if self.hub is not None:
+                for transaction in written:
+                    self.hub.publish({**transaction, "timestamp": transaction["timestamp"].isoformat()})
+
+    async def start_monitoring(self):
+        addresses = await self.load_wallets()
+        await self.load_holdings()
+        await self.prices.load()
+        if self.rollups is not None:
+            await self.load_rollups()
+        if not addresses:
+            logger.warning("没有要监控的钱包地址，等待新增钱包")
+        logger.info("开始监控", extra={
+            "program": RAYDIUM_V4_PROGRAM_ID, "wallets": len(addresses), "mode": self.mode
+        })
+
+        # 钱包按地址分配到多个连接，每个钱包单独订阅，钱包增删时增量更新订阅，不需要重连
+        recorder = FrameRecorder(config.RECORD_FRAMES_PATH) if config.RECORD_FRAMES_PATH else None
+        if self.mode == SIGNATURE_MODE:
+            # 签名通知的确认级别需要与 getTransaction 一致，否则通知到达时还查不到交易
+            options = {"wallet_kind": LOGS, "commitment": config.TX_COMMITMENT}
+        else:
+            options = {"wallet_kind": PROGRAM}
+        if self.backfill_enabled:
+            options["on_connect"] = self._on_connect
+        self.subscription = SubscriptionManager(self.ws_url, RAYDIUM_V4_PROGRAM_ID, self.queue.put,
+                                                shards=config.WS_SHARDS, recorder=recorder, **options)
+        self.subscription.add_many(addresses)
+        if self.mode == ACCOUNT_MODE:
+            for pubkey in config.HOT_ACCOUNTS:
+                self.subscription.add_account(pubkey)
+        self.registry.add_listener(self._on_wallet_change)
+
+        # 接收队列中的事件分发到各处理通道，写入由单独的任务合并成批
+        self.process_lanes = PartitionedLanes(self.lanes, self._lane_key, self._process_batch,
+                                              config.LANE_QUEUE_SIZE, self.batch_size, self.flush_interval)
+        process_task = asyncio.create_task(self.process_lanes.run(self.queue))
+        write_task = asyncio.create_task(self._write_rows())
+        price_task = asyncio.create_task(self.prices.run())
+        sync_task = asyncio.create_task(self._sync_wallets()) if self.wallet_sync_interval > 0 else None
         try:
-            while True:
-                if websocket.open:
-                    await websocket.ping()
-                    print("Ping 已发送")
-                await asyncio.sleep(15)  # 改为每15秒发送一次 ping
+            await self.subscription.run()
+        finally:
+            # 先停止接收，再把已接收的消息处理并写入完，最后取消其余任务
+            self.registry.remove_listener(self._on_wallet_change)
+            if sync_task is not None:
+                sync_task.cancel()
+            for task in list(self._backfill_tasks):
+                task.cancel()
+            await self._drain(process_task, write_task)
+            price_task.cancel()
+            await asyncio.gather(price_task, return_exceptions=True)
+            await self.tokens.close()
+            await self.rpc.close()
+            if recorder is not None:
+                recorder.close()
+
+    async def _drain(self, process_task: asyncio.Task, write_task: asyncio.Task):
+        """依次清空接收队列、处理通道和写入队列
+
+        这些消息对应的余额变化已经（或将要）更新到内存中的持仓，直接取消会丢失交易。
+        写入失败会重试，所以整个过程最多等待 SHUTDOWN_DRAIN_TIMEOUT 秒，并且不超过主实例租约的剩余时间：
+        租约已被其他实例接管时不再写入，避免两个实例互相覆盖持仓。超时后放弃剩余的记录。
+        """
+        timeout = config.SHUTDOWN_DRAIN_TIMEOUT
+        if self.drain_budget is not None:
+            timeout = min(timeout, self.drain_budget())
+        if timeout > 0:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            try:
+                # 接收队列满时关闭标记要等分发腾出位置
+                await asyncio.wait_for(self.queue.close(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.wait({process_task}, timeout=max(0.0, deadline - loop.time()))
+            if process_task.done():
+                await self.pending_rows.close()
+                await asyncio.wait({write_task}, timeout=max(0.0, deadline - loop.time()))
+        if not write_task.done():
+            ERRORS.labels("write").inc()
+            logger.warning("停止时未能处理完已接收的消息", extra={
+                "queue": self.queue.qsize(), "lanes": self.process_lanes.qsize(),
+                "pending": self.pending_rows.qsize()
+            })
+        process_task.cancel()
+        write_task.cancel()
+        await asyncio.gather(process_task, write_task, return_exceptions=True)
+
+    def _on_connect(self, shard, reconnect: bool):
+        """分片连接后补齐该分片的钱包在断线期间的交易"""
+        task = asyncio.create_task(self._catch_up(set(shard.addresses), reconnect))
+        self._backfill_tasks.add(task)
+        task.add_done_callback(self._backfill_tasks.discard)
+
+    async def _catch_up(self, addresses: Set[str], reconnect: bool):
+        try:
+            current_slot = (await self.rpc.call(lambda client: client.get_slot(config.TX_COMMITMENT))).value
         except Exception as e:
-            print(f"Ping 错误: {str(e)}")
+            current_slot = None
+            ERRORS.labels("backfill").inc()
+            logger.warning("获取当前 slot 错误", extra={"error": str(e)})
+        if reconnect:
+            since = {address: self.wallet_slots[address] for address in addresses if address in self.wallet_slots}
+            logger.info("开始补齐断线期间的交易", extra={"wallets": len(since)})
+            await self.backfiller.run(since, self.queue.put)
+        # 连接后的交易由订阅接收，补齐起点至少推进到连接时的 slot（包括还没有交易的钱包）
+        if current_slot is not None:
+            for address in addresses:
+                self._seen_slot(address, current_slot)
+
+    def _on_wallet_change(self, event: str, wallet: WalletRecord):
+        """钱包注册表变化时更新订阅"""
+        if event == "added":
+            logger.info("开始监控新钱包", extra={"wallet": wallet.address})
+            self.subscription.add(wallet.address)
+        elif event == "removed":
+            logger.info("停止监控钱包", extra={"wallet": wallet.address})
+            self.subscription.remove(wallet.address)
+
 
+async def run_monitor(session_factory: async_sessionmaker = AsyncSessionLocal):
+    """运行监控器的入口函数
 
-async def run_monitor(db: Session):
-    """运行监控器的入口函数"""
-    print("开始监控")
-    monitor = SolanaMonitor(db)
-    await monitor.start_monitoring()
+    多个实例（独立进程或 API worker）中只有持有租约的一个在接收，其余作为备用实例等待接管。
+    每次成为主实例时创建新的监控器，从数据库重新加载持仓等状态。
+    交易动态和排行榜由 API 进程从数据库追踪，监控器不在进程内推送。
+    """
+    lease = LeaderLease(session_factory, "monitor")
+    await lease.run(lambda: SolanaMonitor(session_factory, hub=None, rollup_store=None,
+                                          drain_budget=lease.remaining).start_monitoring())
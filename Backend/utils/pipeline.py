@@ -0,0 +1,176 @@
+import asyncio
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from . import async_crud
+from .log import get_logger
+from .metrics import DB_COMMIT_SECONDS, ERRORS, LANE_DEPTH
+
+logger = get_logger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_oldest")
+
+# 关闭标记：放在队列末尾，取到它时说明之前放入的消息都已经取出
+_CLOSED = object()
+
+
+class IngestQueue:
+    """有界接收队列，队列满时按策略阻塞或丢弃最旧的消息"""
+
+    def __init__(self, maxsize: int = 10000, overflow: str = "block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的队列溢出策略: {overflow}")
+        self._queue = asyncio.Queue(maxsize)
+        self.overflow = overflow
+        self.dropped = 0  # 因队列已满被丢弃的消息数量
+        self.closed = False
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, item: Any):
+        """放入一条消息，block 策略下队列满时等待消费者"""
+        if self.overflow == "block":
+            await self._queue.put(item)
+            return
+
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except asyncio.QueueFull:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except asyncio.QueueEmpty:
+                    pass
+
+    async def close(self):
+        """停止接收：关闭前放入的消息仍按顺序取出，取完后 get_batch 返回空列表"""
+        if not self.closed:
+            self.closed = True
+            await self.put(_CLOSED)
+
+    async def get_batch(self, max_items: int, timeout: float) -> List[Any]:
+        """等待至少一条消息，然后在 timeout 秒内最多再收集到 max_items 条
+
+        队列已关闭且关闭前的消息都已取出时返回空列表。
+        """
+        if self.closed and self._queue.empty():
+            return []
+        loop = asyncio.get_running_loop()
+        item = await self._queue.get()
+        if item is _CLOSED:
+            return []
+        items = [item]
+        deadline = loop.time() + timeout
+
+        while len(items) < max_items:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is _CLOSED:
+                break
+            items.append(item)
+
+        return items
+
+
+class PartitionedLanes:
+    """按键哈希把消息分配到多条有序通道，每条通道由一个任务按顺序批量处理
+
+    同一个键的消息总是分到同一条通道，按到达顺序处理；不同通道并发处理，
+    一条通道等待（如解析新代币的网络请求）只会延迟分到该通道的消息。
+    """
+
+    def __init__(self, lanes: int, key: Callable[[Any], str],
+                 handler: Callable[[List[Any]], Awaitable[None]],
+                 maxsize: int = 1000, batch_size: int = 200, flush_interval: float = 0.5):
+        if lanes < 1:
+            raise ValueError("处理通道数量至少为 1")
+        self.key = key
+        self.handler = handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queues = [IngestQueue(maxsize) for _ in range(lanes)]
+        # 已分发但还没处理完的消息数，为 0 时各通道空闲
+        self._unfinished = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def __len__(self) -> int:
+        return len(self.queues)
+
+    def lane_for(self, item: Any) -> int:
+        return zlib.crc32(self.key(item).encode()) % len(self.queues)
+
+    def qsize(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    async def put(self, item: Any):
+        """放入对应的通道，通道满时等待（只有该通道积压时才阻塞分发）"""
+        self._unfinished += 1
+        self._idle.clear()
+        await self.queues[self.lane_for(item)].put(item)
+
+    async def join(self):
+        """等待已分发的消息全部处理完"""
+        await self._idle.wait()
+
+    async def _worker(self, index: int):
+        queue = self.queues[index]
+        depth = LANE_DEPTH.labels(str(index))
+        while True:
+            # 不等待凑批：通道积压时自然成批，空闲时立即处理
+            batch = await queue.get_batch(self.batch_size, 0)
+            depth.set(queue.qsize())
+            try:
+                await self.handler(batch)
+            except Exception as e:
+                ERRORS.labels("process").inc()
+                logger.exception("处理通道错误", extra={"lane": index, "batch": len(batch), "error": str(e)})
+            finally:
+                self._unfinished -= len(batch)
+                if self._unfinished == 0:
+                    self._idle.set()
+
+    async def run(self, source: IngestQueue):
+        """从接收队列批量取出消息（最多等待 flush_interval 凑批）分发到各通道
+
+        接收队列关闭后分发完剩余的消息，等各通道处理完毕再返回；被取消时立即停止。
+        """
+        workers = [asyncio.create_task(self._worker(i)) for i in range(len(self.queues))]
+        try:
+            while True:
+                batch = await source.get_batch(self.batch_size, self.flush_interval)
+                if not batch:
+                    break
+                for item in batch:
+                    await self.put(item)
+            await self.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+
+class BatchWriter:
+    """批量写入交易记录和持仓，每一批在同一个数据库事务中提交"""
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def write(self, rows: List[dict],
+                    holdings: Optional[Dict[Tuple[int, int], float]] = None,
+                    accounts: Optional[Dict[str, Tuple[int, int, int, int]]] = None) -> List[dict]:
+        """使用异步会话写入一批交易，数据库提交不会阻塞事件循环，返回实际新增的交易"""
+        with DB_COMMIT_SECONDS.time():
+            async with self.session_factory() as db:
+                return await async_crud.save_transaction_batch(db, rows, holdings or {}, accounts)
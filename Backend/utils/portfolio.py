@@ -0,0 +1,288 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from . import async_crud, config
+from .log import get_logger
+from .metrics import ERRORS, PORTFOLIO_REFRESH_SECONDS
+
+logger = get_logger(__name__)
+
+# 增量读取时向前多读的时间：更新时间在提交前生成，晚提交的行可能早于上次读到的最大更新时间
+_OVERLAP = timedelta(seconds=5)
+
+
+def _entry_keys(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """(行号, 列号) 编码为一个 int64，按行优先排序"""
+    return (rows.astype(np.int64) << 32) | cols.astype(np.int64)
+
+
+class PortfolioEngine:
+    """全部钱包的持仓估值
+
+    持仓是 钱包 × 代币 的稀疏矩阵（CSR：非零元按 (行, 列) 排序，保存列号和余额两个数组），
+    价格是按列排列的向量（没有价格为 NaN）。估值是一次稀疏矩阵乘向量：
+    余额乘以所在列的价格，再按行区间求和，不需要逐个钱包查询和循环。
+
+    持仓和价格的变化先缓存，revalue() 时一次写入：已有持仓按二分查找原地修改，
+    新持仓合并后重新排序（只有矩阵结构变化时）。钱包和代币按首次出现的顺序分配行号和列号。
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.wallet_info: Dict[int, Tuple[str, Optional[str]]] = {}  # wallet_id -> (地址, 名称)
+        self.token_info: Dict[int, Tuple[str, Optional[str]]] = {}  # token_id -> (合约地址, 符号)
+        self._row_of: Dict[int, int] = {}  # wallet_id -> 行号
+        self._col_of: Dict[int, int] = {}  # token_id -> 列号
+        self._holding_updates: Dict[Tuple[int, int], float] = {}  # (行号, 列号) -> 余额
+        self._price_updates: Dict[int, float] = {}  # 列号 -> 价格
+
+        self._wallet_ids = np.zeros(0, np.int64)  # 行号 -> wallet_id
+        self._token_ids = np.zeros(0, np.int64)  # 列号 -> token_id
+        self._prices = np.zeros(0)
+        self._keys = np.zeros(0, np.int64)
+        self._rows = np.zeros(0, np.int32)
+        self._cols = np.zeros(0, np.int32)
+        self._balances = np.zeros(0)
+        self._indptr = np.zeros(1, np.int64)  # 第 i 行的非零元为 [indptr[i], indptr[i + 1])
+
+        # 估值结果，revalue() 后更新
+        self.values = np.zeros(0)  # 每个持仓的价值
+        self.totals = np.zeros(0)  # 每个钱包的总价值
+        self.token_counts = np.zeros(0, np.int64)  # 每个钱包余额大于 0 的代币数
+        self.unpriced_counts = np.zeros(0, np.int64)  # 其中没有价格的代币数
+        self.updated_at: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    @property
+    def nnz(self) -> int:
+        return len(self._keys)
+
+    def add_wallet(self, wallet_id: int, address: str, name: Optional[str] = None) -> int:
+        self.wallet_info[wallet_id] = (address, name)
+        row = self._row_of.get(wallet_id)
+        if row is None:
+            row = self._row_of[wallet_id] = len(self._row_of)
+        return row
+
+    def add_token(self, token_id: int, address: str, symbol: Optional[str] = None) -> int:
+        self.token_info[token_id] = (address, symbol)
+        col = self._col_of.get(token_id)
+        if col is None:
+            col = self._col_of[token_id] = len(self._col_of)
+        return col
+
+    def set_holding(self, wallet_id: int, token_id: int, balance: float):
+        """钱包和代币需要先登记"""
+        self._holding_updates[(self._row_of[wallet_id], self._col_of[token_id])] = balance
+
+    def set_price(self, token_id: int, price: Optional[float]):
+        """没有登记的代币（没有钱包持有）忽略"""
+        col = self._col_of.get(token_id)
+        if col is not None:
+            self._price_updates[col] = np.nan if price is None else price
+
+    def _apply_updates(self):
+        rows, cols = len(self._row_of), len(self._col_of)
+        if len(self._wallet_ids) < rows:
+            self._wallet_ids = np.fromiter(self._row_of, np.int64, rows)
+        if len(self._token_ids) < cols:
+            self._token_ids = np.fromiter(self._col_of, np.int64, cols)
+            self._prices = np.concatenate([self._prices, np.full(cols - len(self._prices), np.nan)])
+
+        if self._price_updates:
+            updates, self._price_updates = self._price_updates, {}
+            self._prices[np.fromiter(updates, np.int64, len(updates))] = np.fromiter(
+                updates.values(), float, len(updates))
+
+        structure_changed = len(self._indptr) != rows + 1
+        if self._holding_updates:
+            updates, self._holding_updates = self._holding_updates, {}
+            count = len(updates)
+            positions = np.fromiter((key for pair in updates for key in pair), np.int64, count * 2)
+            keys = _entry_keys(positions[0::2], positions[1::2])
+            balances = np.fromiter(updates.values(), float, count)
+            # 已有的持仓原地修改
+            index = np.searchsorted(self._keys, keys)
+            found = index < len(self._keys)
+            found[found] = self._keys[index[found]] == keys[found]
+            self._balances[index[found]] = balances[found]
+            # 新持仓合并后按 (行, 列) 重新排序
+            if not found.all():
+                keys = np.concatenate([self._keys, keys[~found]])
+                balances = np.concatenate([self._balances, balances[~found]])
+                order = np.argsort(keys, kind="stable")
+                self._keys, self._balances = keys[order], balances[order]
+                self._rows = (self._keys >> 32).astype(np.int32)
+                self._cols = (self._keys & 0xFFFFFFFF).astype(np.int32)
+                structure_changed = True
+        if structure_changed:
+            self._indptr = np.searchsorted(self._rows, np.arange(rows + 1))
+
+    def _row_sums(self, values: np.ndarray) -> np.ndarray:
+        """按行求和（CSR 行区间上的 reduceat），没有持仓的行为 0"""
+        starts, ends = self._indptr[:-1], self._indptr[1:]
+        if not len(values):
+            return np.zeros(len(starts), values.dtype)
+        # reduceat 在空区间上返回起点的元素，起点越界时报错，所以先截断再把空行置 0
+        sums = np.add.reduceat(values, np.minimum(starts, len(values) - 1))
+        sums[starts == ends] = 0
+        return sums
+
+    def revalue(self):
+        """写入缓存的变化并重新计算全部钱包的价值"""
+        priced_before = ~np.isnan(self._prices)
+        counts_changed = bool(self._holding_updates) or len(self.token_counts) != len(self._row_of)
+        self._apply_updates()
+        priced = ~np.isnan(self._prices)
+        self.values = self._balances * np.where(priced, self._prices, 0.0)[self._cols]
+        self.totals = self._row_sums(self.values)
+        # 代币数只在持仓变化、或有代币开始（停止）有价格时重新计算，只有价格变化时跳过
+        if counts_changed or len(priced_before) != len(priced) or (priced_before != priced).any():
+            held = self._balances > 0
+            self.token_counts = self._row_sums(held.astype(np.int64))
+            self.unpriced_counts = self._row_sums((held & ~priced[self._cols]).astype(np.int64))
+        self.updated_at = datetime.now()
+
+    def _positions(self, row: int, limit: int) -> List[dict]:
+        """一个钱包余额大于 0 的持仓，按价值从高到低"""
+        start, end = self._indptr[row], self._indptr[row + 1]
+        entries = np.arange(start, end)[self._balances[start:end] > 0]
+        entries = entries[np.lexsort((-self._balances[entries], -self.values[entries]))][:limit]
+        result = []
+        for entry in entries.tolist():
+            col = int(self._cols[entry])
+            token_id = int(self._token_ids[col])
+            address, symbol = self.token_info.get(token_id, (None, None))
+            price = self._prices[col]
+            result.append({
+                "token_id": token_id,
+                "token_address": address,
+                "token_symbol": symbol,
+                "balance": float(self._balances[entry]),
+                "price": None if np.isnan(price) else float(price),
+                "value": float(self.values[entry]),
+            })
+        return result
+
+    def top(self, sort: str = "value", order: str = "desc", limit: int = 100,
+            positions: int = 10) -> List[dict]:
+        """按总价值或代币数排序的前 limit 个钱包，相同时按 wallet_id 升序"""
+        key = (self.totals if sort == "value" else self.token_counts).astype(float)
+        if order == "desc":
+            key = -key
+        rows = np.arange(len(key))
+        if limit < len(key):
+            # 先选出前 limit 个（不排序），只对这部分排序；边界上的并列值可能被任意截断
+            rows = np.argpartition(key, limit - 1)[:limit]
+        rows = rows[np.lexsort((self._wallet_ids[rows], key[rows]))]
+
+        result = []
+        for row in rows.tolist():
+            wallet_id = int(self._wallet_ids[row])
+            address, name = self.wallet_info.get(wallet_id, (None, None))
+            result.append({
+                "wallet_id": wallet_id,
+                "wallet_address": address,
+                "wallet_name": name,
+                "total_value": float(self.totals[row]),
+                "tokens": int(self.token_counts[row]),
+                "unpriced": int(self.unpriced_counts[row]),
+                "positions": self._positions(row, positions) if positions else [],
+            })
+        return result
+
+    def summary(self, sort: str = "value", order: str = "desc", limit: int = 100,
+                positions: int = 10) -> dict:
+        return {
+            "items": self.top(sort, order, limit, positions) if self.updated_at else [],
+            "wallets": len(self.totals),
+            "total_value": float(self.totals.sum()),
+            "updated_at": self.updated_at,
+        }
+
+
+# 进程内共享的估值矩阵，PortfolioLoader 更新，/api/portfolios 读取
+portfolios = PortfolioEngine()
+
+
+class PortfolioLoader:
+    """API 进程定时读取持仓和价格的变化并重新估值
+
+    与 TransactionTailer 一样，每个 API worker 各自从数据库读取，不需要进程间消息通道。
+    持仓按 last_updated、价格按 price_updated_at 增量读取（两列都有索引）；
+    定期全量重新加载，移除已删除的钱包并加入还没有持仓的新钱包。
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, engine: PortfolioEngine = portfolios,
+                 interval: float = config.PORTFOLIO_REFRESH_INTERVAL,
+                 reload_interval: float = config.PORTFOLIO_RELOAD_INTERVAL):
+        self.session_factory = session_factory
+        self.engine = engine
+        self.interval = interval
+        self.reload_interval = reload_interval
+        self._holdings_since: Optional[datetime] = None  # 已读到的最大持仓更新时间
+        self._prices_since: Optional[datetime] = None  # 已读到的最大价格更新时间
+        self._loaded_at = 0.0
+
+    @staticmethod
+    def _since(watermark: Optional[datetime]) -> Optional[datetime]:
+        return None if watermark is None else watermark - _OVERLAP
+
+    def _apply(self, holdings, prices):
+        engine = self.engine
+        for (wallet_id, token_id, balance, last_updated, wallet_address, wallet_name,
+             token_address, token_symbol, price) in holdings:
+            engine.add_wallet(wallet_id, wallet_address, wallet_name)
+            engine.add_token(token_id, token_address, token_symbol)
+            engine.set_holding(wallet_id, token_id, balance or 0.0)
+            engine.set_price(token_id, price)
+            if last_updated is not None and (self._holdings_since is None or last_updated > self._holdings_since):
+                self._holdings_since = last_updated
+        for token_id, price, updated_at in prices:
+            engine.set_price(token_id, price)
+            if updated_at is not None and (self._prices_since is None or updated_at > self._prices_since):
+                self._prices_since = updated_at
+        engine.revalue()
+
+    async def load(self):
+        """全量加载全部钱包、持仓和价格"""
+        async with self.session_factory() as db:
+            wallets = await async_crud.get_all_wallets(db)
+            holdings = await async_crud.get_portfolio_holdings(db)
+            prices = await async_crud.get_token_prices_since(db)
+        # 读取完成后在事件循环中一次性替换，请求不会看到加载到一半的矩阵
+        self.engine.clear()
+        self._holdings_since = self._prices_since = None
+        for wallet in wallets:
+            self.engine.add_wallet(wallet.id, wallet.address, wallet.name)
+        self._apply(holdings, prices)
+        self._loaded_at = time.monotonic()
+        logger.info("已加载持仓估值", extra={"wallets": len(self.engine), "holdings": self.engine.nnz})
+
+    async def poll_once(self) -> int:
+        """读取上次之后的持仓和价格变化并重新估值，返回读取的行数"""
+        async with self.session_factory() as db:
+            holdings = await async_crud.get_portfolio_holdings(db, self._since(self._holdings_since))
+            prices = await async_crud.get_token_prices_since(db, self._since(self._prices_since))
+        self._apply(holdings, prices)
+        return len(holdings) + len(prices)
+
+    async def run(self):
+        while True:
+            try:
+                with PORTFOLIO_REFRESH_SECONDS.time():
+                    if time.monotonic() - self._loaded_at >= self.reload_interval:
+                        await self.load()
+                    else:
+                        await self.poll_once()
+            except Exception as e:
+                ERRORS.labels("portfolio").inc()
+                logger.error("刷新持仓估值错误", extra={"error": str(e)})
+            await asyncio.sleep(self.interval)
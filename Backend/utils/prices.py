@@ -0,0 +1,189 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import aiohttp
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from . import async_crud, config
+from .log import get_logger
+from .metrics import ERRORS, PRICE_FETCH_SECONDS
+
+logger = get_logger(__name__)
+
+
+class PriceEngine:
+    """后台价格刷新
+
+    - 内存价格表覆盖所有见过的 mint，处理阶段只做一次字典查找
+    - 按 TTL 定时批量请求价格（每个请求查询多个 mint）；最近交易过的 mint
+      使用更短的 TTL，并在每轮的刷新预算中优先
+    - 新价格定期批量写回 tokens 表（current_price / price_updated_at）
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, url: str = config.PRICE_API_URL,
+                 batch_size: int = config.PRICE_BATCH_SIZE, ttl: float = config.PRICE_TTL,
+                 hot_ttl: float = config.PRICE_HOT_TTL, hot_window: float = config.PRICE_HOT_WINDOW,
+                 refresh_interval: float = config.PRICE_REFRESH_INTERVAL,
+                 max_per_cycle: int = config.PRICE_MAX_PER_CYCLE,
+                 concurrency: int = config.PRICE_FETCH_CONCURRENCY,
+                 flush_interval: float = config.PRICE_FLUSH_INTERVAL):
+        self.session_factory = session_factory
+        self.url = url
+        self.batch_size = batch_size
+        self.ttl = ttl
+        self.hot_ttl = hot_ttl
+        self.hot_window = hot_window
+        self.refresh_interval = refresh_interval
+        self.max_per_cycle = max_per_cycle
+        self.concurrency = concurrency
+        self.flush_interval = flush_interval
+
+        self.prices: Dict[str, float] = {}  # mint -> USD 价格
+        self._fetched_at: Dict[str, float] = {}  # mint -> 上次请求价格的时间（monotonic），0 表示从未请求
+        self._traded_at: Dict[str, float] = {}  # mint -> 最近一次交易的时间（monotonic）
+        self._dirty: Dict[str, Tuple[float, datetime]] = {}  # 待写回数据库的价格
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._http: Optional[aiohttp.ClientSession] = None
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def get(self, mint: str) -> Optional[float]:
+        return self.prices.get(mint)
+
+    def track(self, mints: Iterable[str]):
+        """登记需要维护价格的 mint"""
+        for mint in mints:
+            self._fetched_at.setdefault(mint, 0.0)
+
+    def touch(self, mint: str):
+        """记录一次交易：登记 mint 并标记为最近交易"""
+        self._traded_at[mint] = time.monotonic()
+        self._fetched_at.setdefault(mint, 0.0)
+
+    async def load(self):
+        """从 tokens 表预热价格表"""
+        async with self.session_factory() as db:
+            rows = await async_crud.get_token_prices(db)
+        for contract_address, price, updated_at in rows:
+            self._fetched_at.setdefault(contract_address, 0.0)
+            if price and updated_at is not None:
+                self.prices[contract_address] = price
+        logger.info("已加载代币价格", extra={"tokens": len(rows), "priced": len(self.prices)})
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """本轮需要刷新的 mint：价格已过期的，最近交易的排在前面"""
+        now = time.monotonic() if now is None else now
+        hot_since = now - self.hot_window
+        due = []
+        for mint, fetched_at in self._fetched_at.items():
+            traded_at = self._traded_at.get(mint, 0.0)
+            ttl = self.hot_ttl if traded_at > hot_since else self.ttl
+            if fetched_at == 0.0 or now - fetched_at >= ttl:
+                due.append((traded_at, mint))
+        due.sort(reverse=True)
+        return [mint for _, mint in due[:self.max_per_cycle]]
+
+    async def refresh_once(self) -> int:
+        """刷新一轮到期的价格，返回获取到价格的 mint 数量"""
+        mints = self.due()
+        if not mints or not self.url:
+            return 0
+        now = time.monotonic()
+        for mint in mints:
+            self._fetched_at[mint] = now
+        batches = [mints[i:i + self.batch_size] for i in range(0, len(mints), self.batch_size)]
+        results = await asyncio.gather(*(self._fetch(batch) for batch in batches))
+
+        updated_at = datetime.now()
+        count = 0
+        for prices in results:
+            for mint, price in prices.items():
+                self.prices[mint] = price
+                self._dirty[mint] = (price, updated_at)
+                count += 1
+        return count
+
+    async def flush(self):
+        """把新价格批量写回 tokens 表"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            async with self.session_factory() as db:
+                await async_crud.update_token_prices(db, dirty)
+        except Exception as e:
+            ERRORS.labels("price").inc()
+            logger.error("写回代币价格错误", extra={"tokens": len(dirty), "error": str(e)})
+            # 保留未写入的价格，下次重试（期间获取的新价格优先）
+            self._dirty = {**dirty, **self._dirty}
+
+    async def run(self):
+        """定时刷新价格并写回数据库"""
+        if not self.url:
+            logger.warning("未配置价格接口，不刷新代币价格")
+            return
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    await self.refresh_once()
+                except Exception as e:
+                    ERRORS.labels("price").inc()
+                    logger.error("刷新代币价格错误", extra={"error": str(e)})
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    await self.flush()
+                    last_flush = time.monotonic()
+                await asyncio.sleep(self.refresh_interval)
+        finally:
+            await self.flush()
+            await self.close()
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    def _get_http(self) -> aiohttp.ClientSession:
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self._http
+
+    async def _fetch(self, mints: List[str]) -> Dict[str, float]:
+        """请求一批 mint 的价格，失败时返回空字典（到期后下一轮重试）"""
+        try:
+            async with self._semaphore:
+                with PRICE_FETCH_SECONDS.time():
+                    async with self._get_http().get(self.url.format(ids=",".join(mints))) as resp:
+                        if resp.status != 200:
+                            ERRORS.labels("price").inc()
+                            logger.warning("获取代币价格失败", extra={"mints": len(mints), "status": resp.status})
+                            return {}
+                        data = await resp.json()
+        except Exception as e:
+            ERRORS.labels("price").inc()
+            logger.warning("获取代币价格错误", extra={"mints": len(mints), "error": str(e)})
+            return {}
+        return parse_prices(data)
+
+
+def parse_prices(data: dict) -> Dict[str, float]:
+    """解析价格接口的响应
+
+    支持 {"mint": {"usdPrice": 1.0}} 和 {"data": {"mint": {"price": "1.0"}}} 两种格式，
+    没有价格的 mint 不返回。
+    """
+    items = data.get("data", data) if isinstance(data, dict) else {}
+    prices = {}
+    for mint, item in (items or {}).items():
+        if not isinstance(item, dict):
+            continue
+        price = item.get("usdPrice", item.get("price"))
+        try:
+            prices[mint] = float(price)
+        except (TypeError, ValueError):
+            continue
+    return prices
@@ -0,0 +1,82 @@
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+
+class WalletRecord(NamedTuple):
+    """监控器使用的钱包快照，不依赖数据库会话"""
+    id: int
+    address: str
+    name: str
+
+
+class WalletRegistry:
+    """按地址索引的内存钱包注册表
+
+    监控器按地址 O(1) 查找钱包；钱包的增删改路由调用 add/update/remove，
+    注册的监听器会收到 ("added" | "removed", WalletRecord) 通知，
+    用于增量更新实时订阅。
+    """
+
+    def __init__(self):
+        self._by_address: Dict[str, WalletRecord] = {}
+        self._listeners: List[Callable[[str, WalletRecord], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._by_address)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._by_address
+
+    def get(self, address: str) -> Optional[WalletRecord]:
+        return self._by_address.get(address)
+
+    def addresses(self) -> List[str]:
+        return list(self._by_address)
+
+    def add_listener(self, listener: Callable[[str, WalletRecord], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, WalletRecord], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: str, record: WalletRecord):
+        for listener in list(self._listeners):
+            try:
+                listener(event, record)
+            except Exception as e:
+                logger.error("钱包注册表通知错误", extra={"event": event, "wallet": record.address, "error": str(e)})
+
+    def load(self, wallets: Iterable):
+        """用数据库中的钱包列表整体替换注册表，只通知有变化的地址"""
+        records = {w.address: WalletRecord(w.id, w.address, w.name) for w in wallets}
+        removed = [r for address, r in self._by_address.items() if address not in records]
+        added = [r for address, r in records.items() if address not in self._by_address]
+        self._by_address = records
+        for record in removed:
+            self._notify("removed", record)
+        for record in added:
+            self._notify("added", record)
+
+    def add(self, wallet):
+        """新增或更新一个钱包（接受 ORM 对象或任何带 id/address/name 的对象）"""
+        record = WalletRecord(wallet.id, wallet.address, wallet.name)
+        is_new = record.address not in self._by_address
+        self._by_address[record.address] = record
+        if is_new:
+            self._notify("added", record)
+
+    def update(self, wallet):
+        """钱包名称等信息变化时刷新记录（地址不变，不影响订阅）"""
+        self.add(wallet)
+
+    def remove(self, address: str):
+        record = self._by_address.pop(address, None)
+        if record:
+            self._notify("removed", record)
+
+
+# 进程内共享的钱包注册表，路由和监控器使用同一个实例
+wallet_registry = WalletRegistry()
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+from typing import Iterator, List, Optional
+import websockets
+
+
+class FrameRecorder:
+    """把收到的原始 WebSocket 消息按行写入 JSONL 语料文件
+
+    每行格式: {"ts": 接收时间戳, "frame": 原始消息}
+    原始消息本身就是 JSON，直接拼接写入，不重新编码。
+    """
+
+    def __init__(self, path: str, flush_every: int = 1000):
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, frame: str):
+        self._file.write(f'{{"ts": {time.time()}, "frame": {frame}}}\n')
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_corpus(path: str) -> Iterator[dict]:
+    """逐行读取语料文件，返回解析后的原始消息"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)["frame"]
+
+
+class ReplayServer:
+    """本地 WebSocket 服务，模拟节点回放语料中的通知消息
+
+    对订阅请求返回订阅 ID，收到第一个订阅请求 start_delay 秒后开始推送通知。
+    rate 为每秒推送的消息数，0 表示尽可能快。
+    """
+
+    def __init__(self, frames: List[dict], rate: float = 0, host: str = "127.0.0.1",
+                 port: int = 0, start_delay: float = 0.5):
+        # 只回放通知消息，语料中的订阅响应不需要
+        self.frames = [json.dumps(f) for f in frames if "params" in f]
+        self.rate = rate
+        self.host = host
+        self.port = port
+        self.start_delay = start_delay
+        self.sent = 0
+        self.done = asyncio.Event()
+        self._server = None
+        self._started = False
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port, max_size=None)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, websocket):
+        stream_task: Optional[asyncio.Task] = None
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+                await websocket.send(json.dumps({
+                    "jsonrpc": "2.0",
+                    "result": True if request.get("method", "").endswith("Unsubscribe") else request["id"],
+                    "id": request["id"]
+                }))
+                if not self._started:
+                    self._started = True
+                    stream_task = asyncio.create_task(self._stream(websocket))
+        finally:
+            if stream_task is not None:
+                stream_task.cancel()
+
+    async def _stream(self, websocket):
+        await asyncio.sleep(self.start_delay)
+        start = time.perf_counter()
+        for i, frame in enumerate(self.frames):
+            if self.rate > 0:
+                delay = start + i / self.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await websocket.send(frame)
+            self.sent += 1
+        self.done.set()
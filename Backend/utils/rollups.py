@@ -0,0 +1,174 @@
+import heapq
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from . import config
+
+# 滑动窗口名称 -> 窗口长度（秒）
+WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+
+
+class WindowStats:
+    """一个代币（或钱包）在一个窗口内的汇总
+
+    counterparts 记录窗口内有买入的另一方及其买入次数：
+    代币的是买入钱包（去重后即买入钱包数），钱包的是买入的代币。
+    """
+    __slots__ = ("buy_volume", "sell_volume", "buys", "sells", "counterparts")
+
+    def __init__(self):
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.buys = 0
+        self.sells = 0
+        self.counterparts: Dict[int, int] = {}
+
+    @property
+    def net_flow(self) -> float:
+        return self.buy_volume - self.sell_volume
+
+    def apply(self, counterpart: int, entry: List[float], sign: int):
+        buy_volume, sell_volume, buys, sells = entry
+        self.buy_volume += sign * buy_volume
+        self.sell_volume += sign * sell_volume
+        self.buys += sign * int(buys)
+        self.sells += sign * int(sells)
+        if buys:
+            count = self.counterparts.get(counterpart, 0) + sign * int(buys)
+            if count > 0:
+                self.counterparts[counterpart] = count
+            else:
+                self.counterparts.pop(counterpart, None)
+
+    def is_empty(self) -> bool:
+        return self.buys <= 0 and self.sells <= 0
+
+
+class _Window:
+    def __init__(self, seconds: int, bucket_seconds: int):
+        self.size = max(1, seconds // bucket_seconds)  # 窗口包含的时间桶数量
+        self.tokens: Dict[int, WindowStats] = {}
+        self.wallets: Dict[int, WindowStats] = {}
+
+    def apply(self, token_id: int, wallet_id: int, entry: List[float], sign: int):
+        for stats_by_id, key, counterpart in ((self.tokens, token_id, wallet_id), (self.wallets, wallet_id, token_id)):
+            stats = stats_by_id.get(key)
+            if stats is None:
+                stats = stats_by_id[key] = WindowStats()
+            stats.apply(counterpart, entry, sign)
+            if stats.is_empty():
+                del stats_by_id[key]
+
+
+class RollupStore:
+    """按代币和钱包增量维护的滑动窗口汇总（1m/5m/1h）
+
+    交易按时间落入固定宽度的时间桶，桶内按 (token_id, wallet_id) 累加；
+    记录交易时把增量加到包含该桶的每个窗口，时间桶移出窗口时再减掉。
+    排行榜只读取窗口内活跃的代币/钱包汇总，不扫描交易表。
+    """
+
+    def __init__(self, bucket_seconds: int = config.ROLLUP_BUCKET_SECONDS, windows: Dict[str, int] = WINDOWS):
+        self.bucket_seconds = bucket_seconds
+        self.windows = {name: _Window(seconds, bucket_seconds) for name, seconds in windows.items()}
+        self._max_size = max(w.size for w in self.windows.values())
+        # 时间桶序号 -> {(token_id, wallet_id): [买入金额, 卖出金额, 买入次数, 卖出次数]}
+        self._buckets: Dict[int, Dict[Tuple[int, int], List[float]]] = {}
+        self._head: Optional[int] = None  # 最新的时间桶序号
+        self.token_info: Dict[int, Tuple[str, str]] = {}  # token_id -> (合约地址, 符号)
+        self.wallet_info: Dict[int, Tuple[str, str]] = {}  # wallet_id -> (地址, 名称)
+
+    def _seq(self, when: datetime) -> int:
+        return int(when.timestamp() // self.bucket_seconds)
+
+    def advance(self, now: Optional[datetime] = None):
+        """把窗口推进到 now，移出窗口的时间桶从汇总中减掉"""
+        seq = self._seq(now or datetime.now())
+        if self._head is None:
+            self._head = seq
+            return
+        if seq <= self._head:
+            return
+        for window in self.windows.values():
+            old_left, new_left = self._head - window.size + 1, seq - window.size + 1
+            for bucket_seq in sorted(s for s in self._buckets if old_left <= s < new_left):
+                for (token_id, wallet_id), entry in self._buckets[bucket_seq].items():
+                    window.apply(token_id, wallet_id, entry, -1)
+        self._head = seq
+        oldest = seq - self._max_size + 1
+        for bucket_seq in [s for s in self._buckets if s < oldest]:
+            del self._buckets[bucket_seq]
+
+    def record(self, transaction: dict):
+        """记录一笔已写入的交易（监控器写入后的交易字典）"""
+        seq = self._seq(transaction["timestamp"])
+        self.advance(transaction["timestamp"])
+        if seq <= self._head - self._max_size:
+            return  # 早于最大窗口
+
+        token_id, wallet_id = transaction["token_id"], transaction["wallet_id"]
+        if "token_address" in transaction:
+            self.token_info[token_id] = (transaction["token_address"], transaction["token_symbol"])
+        if "wallet_address" in transaction:
+            self.wallet_info[wallet_id] = (transaction["wallet_address"], transaction["wallet_name"])
+
+        amount = transaction["amount"] or 0.0
+        delta = [amount, 0.0, 1, 0] if transaction["tx_type"] == "buy" else [0.0, amount, 0, 1]
+        entry = self._buckets.setdefault(seq, {}).setdefault((token_id, wallet_id), [0.0, 0.0, 0, 0])
+        for i, value in enumerate(delta):
+            entry[i] += value
+        for window in self.windows.values():
+            if seq > self._head - window.size:
+                window.apply(token_id, wallet_id, delta, 1)
+
+    def record_many(self, transactions: Iterable[dict]):
+        for transaction in transactions:
+            self.record(transaction)
+
+    def _top(self, stats_by_id: Dict[int, WindowStats], sort: str, limit: int) -> List[Tuple[int, WindowStats]]:
+        if sort in ("buyers", "tokens"):
+            key = lambda item: (len(item[1].counterparts), item[1].buy_volume)
+        else:
+            key = lambda item: getattr(item[1], sort)
+        return heapq.nlargest(limit, stats_by_id.items(), key=key)
+
+    def top_tokens(self, window: str, sort: str = "buyers", limit: int = 20) -> List[dict]:
+        """窗口内的代币排行：买入钱包数、买卖金额、净流入"""
+        self.advance()
+        result = []
+        for token_id, stats in self._top(self.windows[window].tokens, sort, limit):
+            address, symbol = self.token_info.get(token_id, (None, None))
+            result.append({
+                "token_id": token_id,
+                "token_address": address,
+                "token_symbol": symbol,
+                "buyers": len(stats.counterparts),
+                "buys": stats.buys,
+                "sells": stats.sells,
+                "buy_volume": stats.buy_volume,
+                "sell_volume": stats.sell_volume,
+                "net_flow": stats.net_flow,
+            })
+        return result
+
+    def top_wallets(self, window: str, sort: str = "buy_volume", limit: int = 20) -> List[dict]:
+        """窗口内的钱包排行：买入代币数、买卖金额、净流入"""
+        self.advance()
+        result = []
+        for wallet_id, stats in self._top(self.windows[window].wallets, sort, limit):
+            address, name = self.wallet_info.get(wallet_id, (None, None))
+            result.append({
+                "wallet_id": wallet_id,
+                "wallet_address": address,
+                "wallet_name": name,
+                "tokens": len(stats.counterparts),
+                "buys": stats.buys,
+                "sells": stats.sells,
+                "buy_volume": stats.buy_volume,
+                "sell_volume": stats.sell_volume,
+                "net_flow": stats.net_flow,
+            })
+        return result
+
+
+# 进程内共享的汇总，监控器写入后更新，排行榜路由读取
+rollups = RollupStore()
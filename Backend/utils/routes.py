@@ -1,141 +1,319 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
-from .database import get_db
-from . import crud, schemas
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Literal, Optional, Union
+from .database import get_async_db
+from . import async_crud, schemas, config
+from .registry import wallet_registry
+from .broadcast import feed_hub
+from .metrics import metrics
+from .rollups import rollups
+from .portfolio import portfolios
+from .wallet_import import IMPORT_FORMATS, ImportSummary, import_wallet_chunk, import_wallets, parse_upload
+
+# 实时动态空闲时发送心跳的间隔（秒）
+FEED_HEARTBEAT_INTERVAL = 15
 
 router = APIRouter()
 
+# 监控器在 API 进程内运行时（MONITOR_IN_API）直接更新进程内的钱包注册表，增删的钱包立即生效；
+# 监控器在其他进程中时这里的注册表没有监听者，由监控器每 WALLET_SYNC_INTERVAL 秒从数据库同步，
+# 增删的钱包最多延迟这么久才开始或停止监控
+_monitor_registry = wallet_registry if config.MONITOR_IN_API else None
+_on_created = _monitor_registry.add if _monitor_registry is not None else None
+
 # 钱包CRUD操作
 @router.post("/wallets/", response_model=schemas.Wallet)
-def create_wallet(wallet: schemas.WalletCreate, db: Session = Depends(get_db)):
-    db_wallet = crud.get_wallet_by_address(db, address=wallet.address)
+async def create_wallet(wallet: schemas.WalletCreate, db: AsyncSession = Depends(get_async_db)):
+    """添加钱包；监控器在其他进程中时最多 WALLET_SYNC_INTERVAL 秒后开始监控"""
+    db_wallet = await async_crud.get_wallet_by_address(db, address=wallet.address)
     if db_wallet:
         raise HTTPException(status_code=400, detail="地址已存在")
-    return crud.create_wallet(db=db, wallet=wallet)
+    new_wallet = await async_crud.create_wallet(db=db, wallet=wallet)
+    # 通知进程内的监控器开始监控新钱包
+    if _monitor_registry is not None:
+        _monitor_registry.add(new_wallet)
+    return new_wallet
 
 @router.get("/wallets/", response_model=List[schemas.Wallet])
-def read_wallets(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_wallets(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
     print("收到获取钱包列表请求")
-    wallets = crud.get_wallets(db, skip=skip, limit=limit)
+    wallets = await async_crud.get_wallets(db, skip=skip, limit=limit)
     print(f"返回钱包数量: {len(wallets)}")
     return wallets
 
 @router.get("/wallets/{wallet_id}", response_model=schemas.Wallet)
-def read_wallet(wallet_id: int, db: Session = Depends(get_db)):
-    wallet = crud.get_wallet(db, wallet_id=wallet_id)
+async def read_wallet(wallet_id: int, db: AsyncSession = Depends(get_async_db)):
+    wallet = await async_crud.get_wallet(db, wallet_id=wallet_id)
     if wallet is None:
         raise HTTPException(status_code=404, detail="钱包未找到")
     return wallet
 
 @router.delete("/wallets/{wallet_id}")
-def delete_wallet(wallet_id: int, db: Session = Depends(get_db)):
-    wallet = crud.get_wallet(db, wallet_id=wallet_id)
+async def delete_wallet(wallet_id: int, db: AsyncSession = Depends(get_async_db)):
+    """删除钱包；监控器在其他进程中时最多 WALLET_SYNC_INTERVAL 秒后停止监控"""
+    wallet = await async_crud.get_wallet(db, wallet_id=wallet_id)
     if wallet is None:
         raise HTTPException(status_code=404, detail="钱包未找到")
-    crud.delete_wallet(db, wallet_id)
+    await async_crud.delete_wallet(db, wallet_id)
+    if _monitor_registry is not None:
+        _monitor_registry.remove(wallet.address)
     return {"message": "钱包已删除"}
 
 @router.put("/wallets/{wallet_id}", response_model=schemas.Wallet)
-def update_wallet(wallet_id: int, wallet: schemas.WalletUpdate, db: Session = Depends(get_db)):
-    db_wallet = crud.get_wallet(db, wallet_id=wallet_id)
+async def update_wallet(wallet_id: int, wallet: schemas.WalletUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_wallet = await async_crud.get_wallet(db, wallet_id=wallet_id)
     if db_wallet is None:
         raise HTTPException(status_code=404, detail="钱包未找到")
-    return crud.update_wallet(db, wallet_id, wallet)
+    updated_wallet = await async_crud.update_wallet(db, wallet_id, wallet)
+    if _monitor_registry is not None:
+        _monitor_registry.update(updated_wallet)
+    return updated_wallet
 
 @router.post("/wallets/batch", response_model=schemas.BatchImportResponse)
-def batch_create_wallets(wallets: List[schemas.WalletCreate], db: Session = Depends(get_db)):
+async def batch_create_wallets(wallets: List[schemas.WalletCreate], db: AsyncSession = Depends(get_async_db)):
+    """批量添加钱包；监控器在其他进程中时最多 WALLET_SYNC_INTERVAL 秒后开始监控"""
     print(f"收到批量导入请求，钱包数量: {len(wallets)}")
-    result = []
-    errors = []
-    
-    for wallet in wallets:
-        try:
-            # 检查地址是否已存在
-            if crud.get_wallet_by_address(db, address=wallet.address):
-                errors.append(f"地址已存在: {wallet.address}")
-                continue
-                
-            # 创建新钱包
-            new_wallet = crud.create_wallet(db=db, wallet=wallet)
-            # 转换为 Pydantic 模型
-            result.append(schemas.Wallet.model_validate(new_wallet))
-        except Exception as e:
-            errors.append(f"导入失败 {wallet.address}: {str(e)}")
-    
+    # 按块导入：每块一次存在性查询和一条批量插入
+    summary = ImportSummary(max_errors=len(wallets), keep_created=True)
+    size = config.WALLET_IMPORT_CHUNK_SIZE
+    for start in range(0, len(wallets), size):
+        rows = [(f"第 {i + 1} 条", w.model_dump()) for i, w in enumerate(wallets[start:start + size], start)]
+        await import_wallet_chunk(db, rows, summary, on_created=_on_created)
+
     response_data = schemas.BatchImportResponse(
-        success=result,
-        errors=errors,
-        total_success=len(result),
-        total_errors=len(errors)
+        success=[schemas.Wallet.model_validate(w) for w in summary.created],
+        errors=summary.errors,
+        total_success=summary.total_success,
+        total_errors=summary.total_errors
     )
     
-    print(f"导入完成，成功: {len(result)}, 失败: {len(errors)}")
+    print(f"导入完成，成功: {summary.total_success}, 失败: {summary.total_errors}")
     return response_data
 
+@router.post("/wallets/import", response_model=schemas.WalletImportResponse)
+async def import_wallets_upload(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """流式导入钱包文件（请求体为 CSV 或 NDJSON），边读边写，内存占用与文件大小无关
+
+    格式由 format 参数或 Content-Type（text/csv、application/x-ndjson）决定。
+    监控器在其他进程中时，导入的钱包最多 WALLET_SYNC_INTERVAL 秒后开始监控。
+    """
+    fmt = format
+    if fmt is None:
+        content_type = request.headers.get("content-type", "")
+        fmt = "csv" if "csv" in content_type else "ndjson" if "json" in content_type else None
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="无法确定文件格式，请指定 format=csv 或 format=ndjson")
+
+    summary = await import_wallets(
+        db,
+        parse_upload(request.stream(), fmt),
+        ImportSummary(max_errors=config.WALLET_IMPORT_MAX_ERRORS),
+        chunk_size=config.WALLET_IMPORT_CHUNK_SIZE,
+        on_created=_on_created
+    )
+    return schemas.WalletImportResponse(
+        total_rows=summary.total_rows,
+        total_success=summary.total_success,
+        total_errors=summary.total_errors,
+        errors=summary.errors
+    )
+
 # Token相关路由
 @router.post("/tokens/", response_model=schemas.Token)
-def create_token(token: schemas.TokenCreate, db: Session = Depends(get_db)):
-    db_token = crud.get_token_by_symbol(db, symbol=token.symbol)
+async def create_token(token: schemas.TokenCreate, db: AsyncSession = Depends(get_async_db)):
+    db_token = await async_crud.get_token_by_symbol(db, symbol=token.symbol)
     if db_token:
         raise HTTPException(status_code=400, detail="代币已存在")
-    return crud.create_token(db=db, token=token)
+    return await async_crud.create_token(db=db, token_data=token.model_dump())
 
 @router.get("/tokens/", response_model=List[schemas.Token])
-def read_tokens(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    tokens = crud.get_tokens(db, skip=skip, limit=limit)
+async def read_tokens(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    tokens = await async_crud.get_tokens(db, skip=skip, limit=limit)
     return tokens
 
 @router.get("/tokens/{token_id}", response_model=schemas.Token)
-def read_token(token_id: int, db: Session = Depends(get_db)):
-    token = crud.get_token(db, token_id=token_id)
+async def read_token(token_id: int, db: AsyncSession = Depends(get_async_db)):
+    token = await async_crud.get_token(db, token_id=token_id)
     if token is None:
         raise HTTPException(status_code=404, detail="代币未找到")
     return token
 
 # TokenHolding相关路由
 @router.get("/wallets/{wallet_id}/holdings/", response_model=List[schemas.TokenHolding])
-def read_wallet_holdings(wallet_id: int, db: Session = Depends(get_db)):
-    holdings = crud.get_wallet_holdings(db, wallet_id=wallet_id)
+async def read_wallet_holdings(wallet_id: int, db: AsyncSession = Depends(get_async_db)):
+    holdings = await async_crud.get_wallet_holdings(db, wallet_id=wallet_id)
     return holdings
 
 # Transaction相关路由
 @router.post("/transactions/", response_model=schemas.Transaction)
-def create_transaction(transaction: schemas.TransactionCreate, db: Session = Depends(get_db)):
-    return crud.create_transaction(db=db, transaction=transaction)
+async def create_transaction(transaction: schemas.TransactionCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.create_transaction(db=db, transaction_data=transaction.model_dump())
 
 @router.get("/wallets/{wallet_id}/transactions/", response_model=List[schemas.Transaction])
-def read_wallet_transactions(wallet_id: int, db: Session = Depends(get_db)):
-    transactions = crud.get_wallet_transactions(db, wallet_id=wallet_id)
+async def read_wallet_transactions(wallet_id: int, db: AsyncSession = Depends(get_async_db)):
+    transactions = await async_crud.get_wallet_transactions(db, wallet_id=wallet_id)
     return transactions
 
 
-@router.get("/transactions/monitoring", response_model=schemas.PaginatedResponse)
-def read_monitoring_transactions(
+@router.get("/transactions/monitoring",
+            response_model=Union[schemas.PaginatedResponse, schemas.CompactPaginatedResponse])
+async def read_monitoring_transactions(
     page: int = 1,
     size: int = 20, 
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    total: Optional[Literal["exact", "approx", "none"]] = None,
+    format: Literal["full", "compact"] = "full",
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取所有监控地址的最新交易动态"""
-    print(f"获取监控地址交易动态: 页码={page}, 每页数量={size}")
+    """获取所有监控地址的最新交易动态
+
+    传入 cursor 参数（第一页传空字符串）时使用游标分页，响应中的 next_cursor 用于获取下一页；
+    total 控制总数统计方式，页码分页默认 exact，游标分页默认 none。
+    format=compact 时交易只带 wallet_id/token_id，钱包和代币按 id 去重后放在 wallets/tokens 中。
+    """
+    print(f"获取监控地址交易动态: 页码={page}, 每页数量={size}, 游标={cursor}")
     
     # 计算跳过的记录数
     skip = (page - 1) * size
+    if total is None:
+        total = "exact" if cursor is None else "none"
     
     # 获取数据
-    result = crud.get_monitoring_transactions(db, skip=skip, limit=size)
+    try:
+        result = await async_crud.get_monitoring_transactions(
+            db, skip=skip, limit=size, cursor=cursor, total_mode=total, compact=format == "compact"
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的游标")
     
     # 构造响应
-    response = schemas.PaginatedResponse(
+    page_fields = dict(
         items=result["items"],
         total=result["total"],
         page=page,
         size=size,
-        total_pages=result["total_pages"]
+        total_pages=result["total_pages"],
+        next_cursor=result["next_cursor"]
     )
+    if format == "compact":
+        response = schemas.CompactPaginatedResponse(
+            **page_fields, wallets=result["wallets"], tokens=result["tokens"]
+        )
+    else:
+        response = schemas.PaginatedResponse(**page_fields)
     
     print(f"返回交易数量: {len(result['items'])}, 总记录数: {result['total']}")
     return response
+
+
+# 实时交易动态
+@router.get("/transactions/stream")
+async def stream_transactions(
+    wallet: Optional[List[str]] = Query(None),
+    token: Optional[List[str]] = Query(None)
+):
+    """以 Server-Sent Events 推送新记录的交易，可按钱包地址和代币地址过滤"""
+    subscriber = feed_hub.subscribe(wallets=wallet, tokens=token)
+
+    async def events():
+        try:
+            while not subscriber.evicted:
+                try:
+                    payload = await asyncio.wait_for(subscriber.queue.get(), FEED_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+            # 消费过慢被移除，客户端可重新连接
+            yield "event: evicted\ndata: {}\n\n"
+        finally:
+            feed_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/transactions/ws")
+async def transactions_websocket(
+    websocket: WebSocket,
+    wallet: Optional[List[str]] = Query(None),
+    token: Optional[List[str]] = Query(None)
+):
+    """以 WebSocket 推送新记录的交易，过滤条件与 /transactions/stream 相同"""
+    await websocket.accept()
+    subscriber = feed_hub.subscribe(wallets=wallet, tokens=token)
+
+    async def wait_closed():
+        # 只推送不接收，需要单独读取才能及时发现客户端断开
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    closed = asyncio.create_task(wait_closed())
+    try:
+        while not subscriber.evicted:
+            get = asyncio.create_task(subscriber.queue.get())
+            done, _ = await asyncio.wait({get, closed}, return_when=asyncio.FIRST_COMPLETED)
+            if closed in done:
+                get.cancel()
+                return
+            await websocket.send_text(get.result())
+            # 一次发送队列中已积压的全部消息
+            while not subscriber.queue.empty():
+                await websocket.send_text(subscriber.queue.get_nowait())
+        # 消费过慢被移除
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        closed.cancel()
+        feed_hub.unsubscribe(subscriber)
+
+# 排行榜：读取增量维护的滑动窗口汇总，不扫描交易表
+@router.get("/leaderboard/tokens", response_model=List[schemas.TokenRollup])
+async def read_token_leaderboard(
+    window: Literal["1m", "5m", "1h"] = "5m",
+    sort: Literal["buyers", "buy_volume", "net_flow", "buys"] = "buyers",
+    limit: int = Query(20, ge=1, le=200)
+):
+    """窗口内被多个监控钱包买入的代币排行"""
+    return rollups.top_tokens(window, sort, limit)
+
+@router.get("/leaderboard/wallets", response_model=List[schemas.WalletRollup])
+async def read_wallet_leaderboard(
+    window: Literal["1m", "5m", "1h"] = "5m",
+    sort: Literal["buy_volume", "net_flow", "tokens", "buys"] = "buy_volume",
+    limit: int = Query(20, ge=1, le=200)
+):
+    """窗口内的钱包买卖排行"""
+    return rollups.top_wallets(window, sort, limit)
+
+# 持仓估值：读取后台定时刷新的估值矩阵，不逐个钱包查询持仓
+@router.get("/portfolios", response_model=schemas.PortfolioList)
+async def read_portfolios(
+    sort: Literal["value", "tokens"] = "value",
+    order: Literal["desc", "asc"] = "desc",
+    limit: int = Query(100, ge=1, le=10000),
+    positions: int = Query(10, ge=0, le=1000)
+):
+    """全部监控钱包的美元估值，按总价值或持有代币数排序取前 limit 个
+
+    positions 为每个钱包返回的持仓数（按价值从高到低），0 表示只返回总价值。
+    估值每 PORTFOLIO_REFRESH_INTERVAL 秒刷新一次，updated_at 为最近一次估值的时间。
+    """
+    return portfolios.summary(sort, order, limit, positions)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    """Prometheus 格式的运行指标"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
   
 
 #   [{
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class WalletBase(BaseModel):
@@ -26,6 +26,12 @@ class BatchImportResponse(BaseModel):
     total_success: int
     total_errors: int 
 
+class WalletImportResponse(BaseModel):
+    total_rows: int
+    total_success: int
+    total_errors: int
+    errors: List[str]  # 最多返回 WALLET_IMPORT_MAX_ERRORS 条
+
 # Token相关
 class TokenBase(BaseModel):
     symbol: str
@@ -66,6 +72,53 @@ class Transaction(TransactionBase):
     class Config:
         from_attributes = True
 
+# 排行榜（滑动窗口汇总）
+class TokenRollup(BaseModel):
+    token_id: int
+    token_address: Optional[str] = None
+    token_symbol: Optional[str] = None
+    buyers: int  # 窗口内买入的不同钱包数
+    buys: int
+    sells: int
+    buy_volume: float
+    sell_volume: float
+    net_flow: float
+
+class WalletRollup(BaseModel):
+    wallet_id: int
+    wallet_address: Optional[str] = None
+    wallet_name: Optional[str] = None
+    tokens: int  # 窗口内买入的不同代币数
+    buys: int
+    sells: int
+    buy_volume: float
+    sell_volume: float
+    net_flow: float
+
+# 持仓估值
+class PortfolioPosition(BaseModel):
+    token_id: int
+    token_address: Optional[str] = None
+    token_symbol: Optional[str] = None
+    balance: float
+    price: Optional[float] = None  # 没有价格时为空，价值按 0 计算
+    value: float
+
+class Portfolio(BaseModel):
+    wallet_id: int
+    wallet_address: Optional[str] = None
+    wallet_name: Optional[str] = None
+    total_value: float
+    tokens: int  # 余额大于 0 的代币数
+    unpriced: int  # 其中没有价格的代币数
+    positions: List[PortfolioPosition]  # 按价值从高到低
+
+class PortfolioList(BaseModel):
+    items: List[Portfolio]
+    wallets: int  # 钱包总数
+    total_value: float  # 全部钱包的总价值
+    updated_at: Optional[datetime] = None  # 最近一次估值的时间，还没有加载完成时为空
+
 # TokenHolding相关
 class TokenHoldingBase(BaseModel):
     balance: float
@@ -87,13 +140,33 @@ class TokenHolding(TokenHoldingBase):
 # 分页响应模型
 class PaginatedResponse(BaseModel):
     items: List[Transaction]
-    total: int
+    total: Optional[int] = None  # total=none 时不统计
     page: int
     size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # 游标分页时下一页的游标，没有更多数据时为空
 
     class Config:
         from_attributes = True 
 
+class CompactTransaction(TransactionBase):
+    """只带 wallet_id/token_id 的交易，关联对象放在分页响应的 wallets/tokens 中"""
+    id: int
+    wallet_id: int
+    token_id: int
+
+    class Config:
+        from_attributes = True
+
+class CompactPaginatedResponse(BaseModel):
+    items: List[CompactTransaction]
+    wallets: Dict[int, Wallet]  # 本页涉及的钱包（去重）
+    tokens: Dict[int, Token]  # 本页涉及的代币（去重）
+    total: Optional[int] = None
+    page: int
+    size: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+
 
         
\ No newline at end of file
@@ -0,0 +1,329 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+import zlib
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+import websockets
+from . import config
+from .endpoints import EndpointPool
+from .decoder import (AccountUpdate, Message, SignatureNotice, decode_message, to_account_update,
+                      to_signature_notice)
+from .log import Sampler, get_logger
+from .metrics import DECODE_SECONDS, ERRORS, FRAMES_RECEIVED, RECONNECTS
+from .replay import FrameRecorder
+
+logger = get_logger(__name__)
+
+_decode_seconds = DECODE_SECONDS.labels()
+_decode_errors = ERRORS.labels("decode")
+
+# 订阅类型: program 按钱包过滤的 programSubscribe, account 单个代币账户的 accountSubscribe,
+# logs 提到该钱包的交易的 logsSubscribe（通知只带交易签名）
+PROGRAM = "program"
+ACCOUNT = "account"
+LOGS = "logs"
+WALLET_KINDS = (PROGRAM, LOGS)
+
+_UNSUBSCRIBE_METHODS = {PROGRAM: "programUnsubscribe", ACCOUNT: "accountUnsubscribe", LOGS: "logsUnsubscribe"}
+
+Notification = Union[AccountUpdate, SignatureNotice]
+
+
+def _endpoint_pool(endpoints: Union[str, Iterable[str], EndpointPool]) -> EndpointPool:
+    if isinstance(endpoints, EndpointPool):
+        return endpoints
+    return EndpointPool([endpoints] if isinstance(endpoints, str) else endpoints, "ws")
+
+
+class SubscriptionShard:
+    """在一个 WebSocket 连接上维护一组订阅
+
+    每个钱包单独订阅（programSubscribe + memcmp 过滤 owner 字段，或 wallet_kind 为 logs 时
+    logsSubscribe 提到该钱包的交易），热点代币账户可以直接 accountSubscribe，
+    因此可以在不断开连接的情况下增量订阅或退订。
+    连接断开后从节点池中选择得分最好的节点重连并重新订阅全部地址，
+    失败的节点指数退避，有其他可用节点时立即切换。
+    """
+
+    def __init__(self, endpoints: Union[str, Iterable[str], EndpointPool], program_id: str,
+                 on_notification: Callable[[Notification], Awaitable[None]],
+                 commitment: str = "processed",
+                 recorder: Optional[FrameRecorder] = None, name: str = "shard-0",
+                 wallet_kind: str = PROGRAM,
+                 on_connect: Optional[Callable[["SubscriptionShard", bool], None]] = None):
+        if wallet_kind not in WALLET_KINDS:
+            raise ValueError(f"未知的钱包订阅类型: {wallet_kind}")
+        self.endpoints = _endpoint_pool(endpoints)
+        self.program_id = program_id
+        self.on_notification = on_notification
+        self.commitment = commitment
+        self.recorder = recorder  # 可选：记录原始消息用于回放
+        self.name = name
+        self.wallet_kind = wallet_kind
+        # 每次连接并发出订阅后调用 on_connect(shard, 是否为重连)，用于补齐断线期间的交易
+        self.on_connect = on_connect
+        self.connections = 0
+
+        self.addresses: Set[str] = set()  # 期望订阅的钱包地址
+        self.accounts: Set[str] = set()  # 期望直接订阅的代币账户
+        self.subscriptions: Dict[Tuple[str, str], int] = {}  # (类型, 地址) -> 订阅 ID
+        # accountSubscribe / logsSubscribe 订阅 ID -> 地址（这两种通知不带地址）
+        self._address_by_id: Dict[int, str] = {}
+        self._pending: Dict[int, Tuple[str, str]] = {}  # 订阅请求 ID -> (类型, 地址)
+        self._sent_at: Dict[int, float] = {}  # 订阅请求 ID -> 发送时间，用于测量节点延迟
+        self._endpoint = None  # 当前连接的节点
+        self._request_ids = itertools.count(1)
+        self._outbox: Optional[asyncio.Queue] = None  # 当前连接的待发送消息
+
+        self.frames = 0  # 收到的消息数量
+        self.reconnects = 0
+        self._sample = Sampler(config.LOG_SAMPLE_EVERY)
+        self._frames_metric = FRAMES_RECEIVED.labels(name)
+        self._reconnects_metric = RECONNECTS.labels(name)
+
+    def _wanted(self, kind: str) -> Set[str]:
+        return self.accounts if kind == ACCOUNT else self.addresses
+
+    def add(self, address: str, kind: str = PROGRAM):
+        """增加一个订阅，已连接时立即发送订阅请求"""
+        wanted = self._wanted(kind)
+        if address in wanted:
+            return
+        wanted.add(address)
+        if self._outbox is not None:
+            self._subscribe(kind, address)
+
+    def remove(self, address: str, kind: str = PROGRAM):
+        """移除一个订阅，已订阅时立即退订"""
+        self._wanted(kind).discard(address)
+        subscription_id = self.subscriptions.pop((kind, address), None)
+        if subscription_id is not None:
+            self._address_by_id.pop(subscription_id, None)
+            if self._outbox is not None:
+                self._unsubscribe(kind, subscription_id)
+
+    def _subscribe(self, kind: str, address: str):
+        request_id = next(self._request_ids)
+        self._pending[request_id] = (kind, address)
+        self._sent_at[request_id] = time.perf_counter()
+        if kind == PROGRAM:
+            message = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": "programSubscribe",
+                "params": [
+                    self.program_id,
+                    {
+                        "commitment": self.commitment,
+                        "encoding": "jsonParsed",
+                        "filters": [{"memcmp": {"offset": 32, "bytes": address}}]
+                    }
+                ]
+            }
+        elif kind == LOGS:
+            message = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": "logsSubscribe",
+                "params": [{"mentions": [address]}, {"commitment": self.commitment}]
+            }
+        else:
+            message = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": "accountSubscribe",
+                "params": [address, {"commitment": self.commitment, "encoding": "jsonParsed"}]
+            }
+        self._outbox.put_nowait(message)
+
+    def _unsubscribe(self, kind: str, subscription_id: int):
+        self._outbox.put_nowait({
+            "jsonrpc": "2.0",
+            "id": next(self._request_ids),
+            "method": _UNSUBSCRIBE_METHODS[kind],
+            "params": [subscription_id]
+        })
+
+    def _handle_response(self, message: Message):
+        """处理订阅请求的响应"""
+        key = self._pending.pop(message.id, None)
+        if key is None:
+            return
+        sent_at = self._sent_at.pop(message.id, None)
+        if sent_at is not None and self._endpoint is not None:
+            self.endpoints.record_latency(self._endpoint, time.perf_counter() - sent_at)
+        kind, address = key
+        if message.error is not None:
+            logger.warning("订阅失败", extra={"shard": self.name, "address": address, "error": message.error})
+            return
+
+        subscription_id = message.result
+        if address in self._wanted(kind):
+            self.subscriptions[key] = subscription_id
+            if kind != PROGRAM:
+                self._address_by_id[subscription_id] = address
+        else:
+            # 等待响应期间地址已被移除
+            self._unsubscribe(kind, subscription_id)
+
+    async def _send_loop(self, websocket):
+        while True:
+            message = await self._outbox.get()
+            await websocket.send(json.dumps(message))
+
+    async def run(self):
+        """连接并接收通知，断开后自动重连"""
+        while True:
+            endpoint = self.endpoints.best()
+            wait = endpoint.available_in()
+            if wait > 0:
+                logger.warning("全部节点都在退避中，等待后重连", extra={
+                    "shard": self.name, "endpoint": endpoint.name, "retry_in": round(wait, 2)
+                })
+                await asyncio.sleep(wait)
+            try:
+                started = time.perf_counter()
+                async with websockets.connect(endpoint.url, ping_interval=30,
+                                              open_timeout=config.WS_CONNECT_TIMEOUT) as websocket:
+                    self.endpoints.record_success(endpoint, time.perf_counter() - started)
+                    self._endpoint = endpoint
+                    logger.info("已连接到 WebSocket", extra={
+                        "shard": self.name, "endpoint": endpoint.name,
+                        "wallets": len(self.addresses), "accounts": len(self.accounts)
+                    })
+                    self._outbox = asyncio.Queue()
+                    self._pending.clear()
+                    self._sent_at.clear()
+                    self.subscriptions.clear()
+                    self._address_by_id.clear()
+                    for address in self.addresses:
+                        self._subscribe(self.wallet_kind, address)
+                    for account in self.accounts:
+                        self._subscribe(ACCOUNT, account)
+                    self.connections += 1
+                    if self.on_connect is not None:
+                        self.on_connect(self, self.connections > 1)
+
+                    send_task = asyncio.create_task(self._send_loop(websocket))
+                    try:
+                        await self._receive(websocket)
+                    finally:
+                        send_task.cancel()
+                        self._outbox = None
+                        self._endpoint = None
+
+                # 断开也计入节点失败，下次优先选择其他节点
+                delay = self.endpoints.record_failure(endpoint)
+                logger.warning("WebSocket 连接已断开，准备重连", extra={
+                    "shard": self.name, "endpoint": endpoint.name, "backoff": round(delay, 2)
+                })
+                self.reconnects += 1
+                self._reconnects_metric.inc()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                delay = self.endpoints.record_failure(endpoint)
+                self.reconnects += 1
+                self._reconnects_metric.inc()
+                logger.error("连接错误，切换节点重连", extra={
+                    "shard": self.name, "endpoint": endpoint.name, "error": str(e), "backoff": round(delay, 2)
+                })
+
+    async def _receive(self, websocket):
+        while True:
+            try:
+                response = await websocket.recv()
+            except websockets.ConnectionClosed:
+                return
+
+            self.frames += 1
+            self._frames_metric.inc()
+            if self.recorder is not None:
+                self.recorder.record(response)
+            try:
+                if logger.isEnabledFor(logging.DEBUG) and self._sample():
+                    logger.debug("收到消息", extra={"shard": self.name, "frame": response})
+                started = time.perf_counter()
+                message = decode_message(response)
+                if message.params is None:
+                    notification = None
+                elif message.method == "logsNotification":
+                    notification = to_signature_notice(message.params)
+                else:
+                    notification = to_account_update(message.params)
+                _decode_seconds.observe(time.perf_counter() - started)
+                if message.params is not None:
+                    if notification is None:
+                        continue
+                    if message.method == "accountNotification":
+                        # accountNotification 不带账户地址，按订阅 ID 补上
+                        pubkey = self._address_by_id.get(notification.subscription)
+                        if pubkey is None:
+                            continue
+                        notification = notification._replace(pubkey=pubkey)
+                    elif message.method == "logsNotification":
+                        # 同样按订阅 ID 补上对应的钱包
+                        wallet = self._address_by_id.get(notification.subscription)
+                        if wallet is None:
+                            continue
+                        notification = notification._replace(wallet=wallet)
+                    await self.on_notification(notification)
+                elif message.id is not None:
+                    self._handle_response(message)
+            except Exception as e:
+                _decode_errors.inc()
+                logger.error("处理消息错误", extra={"shard": self.name, "error": str(e)})
+
+
+class SubscriptionManager:
+    """把钱包按地址哈希分配到多个连接（分片）上
+
+    每个分片有独立的连接、重连和接收循环，收到的通知都交给同一个处理阶段。
+    一个分片变慢或断开不会影响其他分片，可订阅的钱包数量随连接数线性增长。
+    全部分片共享同一个节点池，一个分片发现节点故障后其他分片重连时也会避开它。
+    """
+
+    def __init__(self, ws_url: Union[str, Iterable[str], EndpointPool], program_id: str,
+                 on_notification: Callable[[Notification], Awaitable[None]],
+                 shards: int = 1, recorder: Optional[FrameRecorder] = None, **kwargs):
+        if shards < 1:
+            raise ValueError("分片数量至少为 1")
+        endpoints = _endpoint_pool(ws_url)
+        self.shards: List[SubscriptionShard] = [
+            SubscriptionShard(endpoints, program_id, on_notification, recorder=recorder,
+                              name=f"shard-{i}", **kwargs)
+            for i in range(shards)
+        ]
+
+    def shard_for(self, address: str) -> SubscriptionShard:
+        """同一个地址总是分配到同一个分片"""
+        return self.shards[zlib.crc32(address.encode()) % len(self.shards)]
+
+    def add(self, address: str):
+        shard = self.shard_for(address)
+        shard.add(address, shard.wallet_kind)
+
+    def remove(self, address: str):
+        shard = self.shard_for(address)
+        shard.remove(address, shard.wallet_kind)
+
+    def add_account(self, pubkey: str):
+        """直接订阅一个热点代币账户"""
+        self.shard_for(pubkey).add(pubkey, ACCOUNT)
+
+    def remove_account(self, pubkey: str):
+        self.shard_for(pubkey).remove(pubkey, ACCOUNT)
+
+    def add_many(self, addresses: Iterable[str]):
+        for address in addresses:
+            self.add(address)
+
+    @property
+    def addresses(self) -> Set[str]:
+        return set().union(*(shard.addresses for shard in self.shards))
+
+    async def run(self):
+        """并发运行全部分片"""
+        await asyncio.gather(*(shard.run() for shard in self.shards))
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from . import async_crud, config
+from .broadcast import BroadcastHub, feed_hub
+from .rollups import RollupStore, WINDOWS, rollups
+from .log import get_logger
+from .metrics import ERRORS
+
+logger = get_logger(__name__)
+
+
+class TransactionTailer:
+    """API 进程按 id 增量读取 transactions 表中的新交易，推送到实时动态并更新滑动窗口汇总
+
+    监控器在独立进程（或本进程的主实例）中写入，每个 API worker 各自追踪，
+    不需要进程间消息通道。同时只有一个监控器写入，交易 id 按提交顺序递增，
+    按 id 读取只走主键索引。
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, hub: BroadcastHub = feed_hub,
+                 rollup_store: RollupStore = rollups, interval: float = config.FEED_POLL_INTERVAL,
+                 limit: int = config.FEED_POLL_LIMIT):
+        self.session_factory = session_factory
+        self.hub = hub
+        self.rollups = rollup_store
+        self.interval = interval
+        self.limit = limit
+        self.last_id = 0
+
+    async def load(self):
+        """用最大窗口内的已有交易重建滑动窗口汇总，之后只追踪新交易"""
+        since = datetime.now() - timedelta(seconds=max(WINDOWS.values()))
+        async with self.session_factory() as db:
+            last_id = await async_crud.get_max_transaction_id(db)
+            transactions = await async_crud.get_transactions_since(db, since)
+        # 先取最大 id：两次查询之间新增的交易留给 poll_once，不会重复计入
+        self.rollups.record_many(t for t in transactions if t["id"] <= last_id)
+        self.last_id = last_id
+        logger.info("已重建滑动窗口汇总", extra={"transactions": len(transactions), "last_id": last_id})
+
+    async def poll_once(self) -> int:
+        """读取一批新交易，返回读取的数量"""
+        async with self.session_factory() as db:
+            transactions = await async_crud.get_transactions_after(db, self.last_id, self.limit)
+        if not transactions:
+            return 0
+        self.last_id = transactions[-1]["id"]
+        self.rollups.record_many(transactions)
+        for transaction in transactions:
+            event = {k: v for k, v in transaction.items() if k != "id"}
+            event["timestamp"] = transaction["timestamp"].isoformat()
+            self.hub.publish(event)
+        return len(transactions)
+
+    async def run(self):
+        while True:
+            try:
+                await self.load()
+                break
+            except Exception as e:
+                ERRORS.labels("tail").inc()
+                logger.error("重建滑动窗口汇总错误", extra={"error": str(e)})
+                await asyncio.sleep(self.interval)
+        while True:
+            try:
+                # 积压时连续读取，追上后按间隔轮询
+                if await self.poll_once() >= self.limit:
+                    continue
+            except Exception as e:
+                ERRORS.labels("tail").inc()
+                logger.error("追踪新交易错误", extra={"last_id": self.last_id, "error": str(e)})
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional
+import aiohttp
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from . import async_crud
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+PHANTOM_SEARCH_URL = (
+    "https://api.phantom.app/search/v1?query={mint}&chainIds=solana%3A101&platform=extension"
+    "&pageSize=50&searchTypes=fungible&searchContext=swapper"
+    "&supportedNetworkIds=solana%3A101%2Ceip155%3A1%2Ceip155%3A137%2Ceip155%3A8453"
+)
+
+
+class TokenRecord(NamedTuple):
+    """缓存中的代币快照，不依赖数据库会话"""
+    id: int
+    contract_address: str
+    symbol: str
+    name: str
+    decimals: int
+    current_price: Optional[float]
+
+    @classmethod
+    def from_model(cls, token) -> "TokenRecord":
+        return cls(token.id, token.contract_address, token.symbol, token.name,
+                   token.decimals, token.current_price)
+
+
+def _placeholder_name(mint_address: str) -> str:
+    return f"Raydium Token {mint_address[:8]}"
+
+
+def placeholder_token_data(mint_address: str) -> dict:
+    """元数据获取失败时使用的占位代币信息"""
+    return {
+        "contract_address": mint_address,
+        "decimals": 6,
+        "symbol": f"RAY-{mint_address[:4]}",
+        "name": _placeholder_name(mint_address),
+        "current_price": 0.0
+    }
+
+
+def is_placeholder(token) -> bool:
+    """代币记录（TokenRecord 或数据库模型）是否仍是占位元数据，获取到元数据后名称会被修正"""
+    return token.name == _placeholder_name(token.contract_address)
+
+
+class TokenResolver:
+    """代币信息解析器
+
+    - 共享一个 aiohttp 连接池，并限制同时进行的元数据请求数量
+    - 同一个 mint 同时只有一个解析任务，并发的调用者共享结果
+    - 带 TTL 的有界 LRU 缓存；元数据获取失败时先写入占位代币，
+      并用较短的 negative_ttl 缓存，过期后重新尝试获取并修正元数据
+    - 是否为占位代币由记录本身判断（is_placeholder），不额外保存 mint 集合，
+      重启后之前创建的占位代币也会重新获取元数据
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, max_size: int = 10000,
+                 ttl: float = 3600, negative_ttl: float = 60, concurrency: int = 8):
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.concurrency = concurrency
+
+        self.cache: "OrderedDict[str, tuple]" = OrderedDict()  # mint -> (过期时间, TokenRecord)
+        self.hits = 0
+        self.misses = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._http: Optional[aiohttp.ClientSession] = None
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    def _get_http(self) -> aiohttp.ClientSession:
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self._http
+
+    def get_cached(self, mint_address: str) -> Optional[TokenRecord]:
+        entry = self.cache.get(mint_address)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at < time.monotonic():
+            del self.cache[mint_address]
+            return None
+        self.cache.move_to_end(mint_address)
+        return record
+
+    def _put(self, record: TokenRecord, ttl: float):
+        self.cache[record.contract_address] = (time.monotonic() + ttl, record)
+        self.cache.move_to_end(record.contract_address)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def _cache_record(self, record: TokenRecord):
+        ttl = self.negative_ttl if is_placeholder(record) else self.ttl
+        self._put(record, ttl)
+
+    async def resolve(self, mint_address: str) -> Optional[TokenRecord]:
+        """获取代币信息：缓存 -> 数据库 -> 链上元数据（并保存）"""
+        record = self.get_cached(mint_address)
+        if record is not None:
+            self.hits += 1
+            return record
+        self.misses += 1
+
+        task = self._inflight.get(mint_address)
+        if task is None:
+            task = asyncio.create_task(self._load(mint_address))
+            self._inflight[mint_address] = task
+            task.add_done_callback(lambda _: self._inflight.pop(mint_address, None))
+        return await asyncio.shield(task)
+
+    async def resolve_many(self, mint_addresses: Iterable[str]) -> Dict[str, TokenRecord]:
+        """批量解析：未命中缓存的 mint 用一次查询从数据库读取，剩余的并发获取"""
+        result = {}
+        missing = []
+        for mint_address in set(mint_addresses):
+            record = self.get_cached(mint_address)
+            if record is not None:
+                result[mint_address] = record
+            elif mint_address not in self._inflight:
+                missing.append(mint_address)
+
+        if missing:
+            async with self.session_factory() as db:
+                tokens = await async_crud.get_tokens_by_addresses(db, missing)
+            for token in tokens:
+                # 占位代币交给 resolve() 重新获取元数据
+                if is_placeholder(token):
+                    continue
+                record = TokenRecord.from_model(token)
+                self._cache_record(record)
+                result[record.contract_address] = record
+
+        pending = [m for m in set(mint_addresses) if m not in result]
+        records = await asyncio.gather(*(self.resolve(m) for m in pending), return_exceptions=True)
+        for mint_address, record in zip(pending, records):
+            if isinstance(record, TokenRecord):
+                result[mint_address] = record
+        return result
+
+    async def _load(self, mint_address: str) -> Optional[TokenRecord]:
+        # 从数据库查找，占位代币需要重新获取元数据
+        async with self.session_factory() as db:
+            token = await async_crud.get_token_by_address(db, mint_address)
+        if token and not is_placeholder(token):
+            logger.debug("从数据库中获取代币信息", extra={"mint": mint_address})
+            record = TokenRecord.from_model(token)
+            self._cache_record(record)
+            return record
+
+        logger.info("从链上获取代币信息", extra={"mint": mint_address})
+        token_data = await self._fetch_metadata(mint_address)
+
+        async with self.session_factory() as db:
+            if token is not None:
+                # 之前使用了占位元数据，重新获取成功后修正数据库中的记录
+                token = await async_crud.get_token_by_address(db, mint_address)
+                if token_data is not None:
+                    token = await async_crud.update_token_metadata(db, token, token_data)
+                    logger.info("已更新代币元数据", extra={"symbol": token.symbol, "mint": mint_address})
+            else:
+                token = await async_crud.get_or_create_token(db, token_data or placeholder_token_data(mint_address))
+                logger.info("已创建新代币", extra={"symbol": token.symbol, "mint": mint_address})
+
+        record = TokenRecord.from_model(token)
+        self._cache_record(record)
+        return record
+
+    async def _fetch_metadata(self, mint_address: str) -> Optional[dict]:
+        """从 Phantom 搜索接口获取代币元数据，失败时返回 None"""
+        try:
+            async with self._semaphore:
+                async with self._get_http().get(PHANTOM_SEARCH_URL.format(mint=mint_address)) as resp:
+                    if resp.status != 200:
+                        logger.warning("获取代币信息失败", extra={"mint": mint_address, "status": resp.status})
+                        return None
+                    data = await resp.json()
+        except Exception as e:
+            logger.warning("获取代币信息错误", extra={"mint": mint_address, "error": str(e)})
+            return None
+
+        # 获取第一个结果
+        results = data.get("results", [])
+        if not results or results[0].get("type") != "fungible":
+            return None
+        token_info = results[0].get("data", {}).get("data", {})
+        return {
+            "contract_address": mint_address,
+            "decimals": token_info.get("decimals", 6),
+            "symbol": token_info.get("symbol", f"PUMP-{mint_address[:4]}"),
+            "name": token_info.get("name", f"Pump Token {mint_address[:8]}"),
+            "current_price": 0.0  # 价格需要从其他 API 获取
+        }
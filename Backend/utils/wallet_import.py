@@ -0,0 +1,133 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterable, AsyncIterator, Callable, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import async_crud, models, schemas
+
+# 批量导入钱包
+# 按块处理：每块一次存在性查询 + 一条 INSERT ... ON CONFLICT DO NOTHING + 一次提交，
+# 块之间释放写锁；上传文件逐行解析，内存占用与文件大小无关
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+class ImportSummary:
+    """导入结果；错误信息最多保留 max_errors 条，总数仍完整统计"""
+
+    def __init__(self, max_errors: int = 1000, keep_created: bool = False):
+        self.max_errors = max_errors
+        self.keep_created = keep_created
+        self.created: List[models.Wallet] = []
+        self.errors: List[str] = []
+        self.total_rows = 0
+        self.total_success = 0
+        self.total_errors = 0
+
+    def error(self, message: str):
+        self.total_errors += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(message)
+
+
+async def import_wallet_chunk(db: AsyncSession, rows: List[Tuple[str, dict]], summary: ImportSummary,
+                              on_created: Optional[Callable[[models.Wallet], None]] = None):
+    """导入一块钱包数据，rows 是 (行标识, 原始数据) 列表，每行的错误单独记录
+
+    校验错误和写入结果分两步得到，错误按行的顺序排序后再记录，与输入顺序一致。
+    """
+    errors: List[Tuple[int, str]] = []  # (块内序号, 错误信息)
+    wallets = {}  # 地址 -> (块内序号, 行标识, 钱包数据)
+    for index, (label, data) in enumerate(rows):
+        summary.total_rows += 1
+        if data is None:
+            errors.append((index, f"{label}: 无法解析"))
+            continue
+        try:
+            wallet = schemas.WalletCreate.model_validate(data)
+        except ValidationError as e:
+            detail = e.errors()[0]
+            errors.append((index, f"{label}: 数据无效 {'.'.join(map(str, detail['loc']))}: {detail['msg']}"))
+            continue
+        if wallet.address in wallets:
+            errors.append((index, f"{label}: 地址重复: {wallet.address}"))
+            continue
+        wallets[wallet.address] = (index, label, wallet.model_dump())
+
+    created = []
+    if wallets:
+        try:
+            created, existing = await async_crud.bulk_create_wallets(db, [w for _, _, w in wallets.values()])
+        except Exception as e:
+            await db.rollback()
+            for index, label, wallet in wallets.values():
+                errors.append((index, f"{label}: 导入失败 {wallet['address']}: {str(e)}"))
+        else:
+            for address in existing:
+                index, label, _ = wallets[address]
+                errors.append((index, f"{label}: 地址已存在: {address}"))
+
+    for _, message in sorted(errors):
+        summary.error(message)
+    summary.total_success += len(created)
+    for wallet in created:
+        if summary.keep_created:
+            summary.created.append(wallet)
+        if on_created is not None:
+            on_created(wallet)
+
+
+async def import_wallets(db: AsyncSession, rows: AsyncIterable[Tuple[str, dict]], summary: ImportSummary,
+                         chunk_size: int = 1000,
+                         on_created: Optional[Callable[[models.Wallet], None]] = None) -> ImportSummary:
+    """按块导入 rows 中的全部钱包"""
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            await import_wallet_chunk(db, chunk, summary, on_created)
+            chunk = []
+    if chunk:
+        await import_wallet_chunk(db, chunk, summary, on_created)
+    return summary
+
+
+async def iter_lines(stream: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """把字节流按行切分（UTF-8，兼容 BOM 和 \\r\\n）"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def parse_upload(stream: AsyncIterable[bytes], fmt: str) -> AsyncIterator[Tuple[str, dict]]:
+    """逐行解析上传的 CSV（首行为表头: name,address,note）或 NDJSON（每行一个 JSON 对象）
+
+    解析失败的行以 (行标识, None) 返回，由调用方记为错误。
+    """
+    header = None
+    line_no = 0
+    async for line in iter_lines(stream):
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [h.strip().lower() for h in values]
+                continue
+            # 空字段视为未填写
+            yield f"第 {line_no} 行", {k: v.strip() or None for k, v in zip(header, values)}
+        else:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                data = None
+            yield f"第 {line_no} 行", data if isinstance(data, dict) else None